@@ -1,10 +1,35 @@
 from numpy import full
 import streamlit as st
-import json, time
-from ocr_service import run_ocr
-from llm_service import summarize_text, qa_text
-from utils import LANGUAGE_MAP, encode_file, detect_language, download_link, is_pdf
-from config import SUPPORTED_FILES
+import html
+import re
+import time
+from functools import partial
+from itertools import chain
+from ocr_service import split_pages, ocr_cache, page_images, image_store, claim_images
+from llm_service import summarize_text_stream, cached_summary, qa_text_stream, llm_cache
+from metrics import Metrics, metrics
+from telemetry import configure as configure_telemetry
+from utils import LANGUAGE_MAP, download_link
+from remote import resolve_urls
+from config import (
+    SUPPORTED_FILES, JOB_WORKERS, JOB_UI_REFRESH, RETRIEVAL_CHUNK_CHARS, RETRIEVAL_TOP_K, SEARCH_SNIPPETS_PER_PAGE,
+    PAGE_WINDOW_SIZES, EXPORT_FORMATS, PREPROCESS_MAX_PIXELS, PREPROCESS_JPEG_QUALITY, PREPROCESS_GRAYSCALE,
+    DEDUPE_NEAR_DUPLICATES, EXPORT_MEMORY_MAX_DOCS
+)
+from retrieval import get_index
+from scheduler import scheduler
+from search_index import SearchIndex
+from models import PageRecord, from_json
+from export import MIME_TYPES, export_payload, export_file, export_bytes
+from preprocess import preprocess_options, is_image
+from artifacts import artifact_store, served_store, served_url, is_ref, to_ref, from_ref
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from cache import content_hash
+from jobs import job_queue, ensure_workers, share_with_workers, batch_owner, spec_fingerprint
+from dedupe import duplicate_plan
+
+script_start = time.perf_counter()
+telemetry_destination = configure_telemetry()
 
 # ================= PAGE CONFIG =================
 st.set_page_config(
@@ -193,6 +218,29 @@ with st.sidebar:
             st.metric("Processed Files", len(st.session_state.results))
         with col2:
             st.metric("Supported Formats", len(SUPPORTED_FILES))
+    cache_stats = ocr_cache.stats()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("OCR Cache Hits", cache_stats["hits"])
+    with col2:
+        st.metric("OCR Cache Misses", cache_stats["misses"])
+    st.caption(f"🗄️ {cache_stats['entries']} cached document(s), {cache_stats['bytes']/1024:.1f} KB")
+    llm_stats = llm_cache.stats()
+    st.caption(f"🧠 {llm_stats['entries']} cached AI response(s), {llm_stats['hits']} served from cache")
+    for label, metric in (("Summary", "llm.ttft.summary"), ("Q&A", "llm.ttft.qa")):
+        ttft = metrics.summary(metric)
+        if ttft:
+            st.caption(f"⏱️ {label} time to first token: p50 {ttft['p50']:.2f} s, p95 {ttft['p95']:.2f} s")
+    api_stats = scheduler.stats()
+    st.caption(
+        f"🔁 {api_stats['retries']} retried call(s), {api_stats['throttled']} throttled, "
+        f"concurrency limit {api_stats['concurrency_limit']}"
+    )
+    st.caption(f"📡 Traces and metrics exported to {telemetry_destination}")
+    rerun = metrics.summary("app.rerun")
+    panel = metrics.summary("app.panel_render")
+    if rerun and panel:
+        st.caption(f"🖥️ Full rerun p50 {rerun['p50'] * 1000:.0f} ms, result panel p50 {panel['p50'] * 1000:.0f} ms")
     
     st.markdown("---")
     st.markdown("""
@@ -217,7 +265,23 @@ with col1:
     """, unsafe_allow_html=True)
 
 with col2:
-    st.metric("Processing Speed", "Fast", "⚡")
+    speed_metric = st.empty()
+
+def show_speed():
+    # Per-session numbers: pages per minute of processing wall time and per-document latency.
+    speed = st.session_state.get("speed")
+    latency = speed["latency"].summary("document") if speed else None
+    if not latency or not speed["seconds"]:
+        speed_metric.metric("Processing Speed", "—", "no documents processed yet", delta_color="off")
+        return
+    speed_metric.metric(
+        "Processing Speed",
+        f"{speed['pages'] / speed['seconds'] * 60:.0f} pages/min",
+        f"p50 {latency['p50']:.1f} s · p95 {latency['p95']:.1f} s per document",
+        delta_color="off"
+    )
+
+show_speed()
 
 # ================= API KEY SECTION =================
 st.markdown("### 🔐 Authentication")
@@ -284,13 +348,68 @@ else:
             valid_urls = [url.strip() for url in urls if url.strip()]
             st.success(f"✅ {len(valid_urls)} URL(s) ready for processing")
 
+workers = st.slider(
+    "⚙️ OCR worker processes",
+    min_value=1,
+    max_value=max(16, JOB_WORKERS),
+    value=JOB_WORKERS,
+    help="Background processes that run OCR jobs; jobs keep running if this tab is closed"
+)
+stream_pdfs = st.checkbox(
+    "📑 Stream large PDFs page by page",
+    help="Split uploaded PDFs into page ranges, OCR them in parallel and show pages as they arrive. "
+         "PDFs whose page count can't be read, including PDF links, are OCR'd in one call."
+)
+include_images = st.checkbox(
+    "🖼️ Extract embedded images",
+    help="Also download images found in the documents. Text-only OCR is faster and lighter."
+)
+preprocess = None
+if st.checkbox(
+    "🪄 Shrink uploaded images before OCR",
+    help="Fix EXIF rotation, cap resolution, optionally convert to grayscale and re-compress JPG/PNG uploads"
+):
+    with st.expander("Image preprocessing settings"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            max_megapixels = st.slider("Max megapixels", 1.0, 12.0, PREPROCESS_MAX_PIXELS / 1e6, 0.5)
+        with col2:
+            quality = st.slider("JPEG quality", 50, 95, PREPROCESS_JPEG_QUALITY, 5)
+        with col3:
+            grayscale = st.checkbox("Grayscale", value=PREPROCESS_GRAYSCALE)
+    preprocess = preprocess_options(max_pixels=int(max_megapixels * 1e6), grayscale=grayscale, quality=quality)
+near_duplicates = st.checkbox(
+    "♻️ Reuse OCR for near-identical images",
+    value=DEDUPE_NEAR_DUPLICATES,
+    help="Identical files are always OCR'd once. This also matches rescans and resized copies of the same "
+         "image, but can mix up pages that differ only in a few words."
+)
+
 # ================= SESSION =================
 if "results" not in st.session_state:
     st.session_state.results = []
+if "speed" not in st.session_state:
+    st.session_state.speed = {"pages": 0, "seconds": 0.0, "latency": Metrics(), "batches": set()}
+
+session_id = get_script_run_ctx().session_id
+for store in (artifact_store, image_store, served_store()):
+    store.touch_session(session_id)
+    store.maybe_cleanup()
 
 # ================= RUN OCR BUTTON =================
+key_hash = content_hash(api_key)
+if job_queue.pending(key_hash):
+    # Jobs left over from a closed tab or an app restart resume as soon as their key is entered again.
+    ensure_workers(api_key, workers)
+share_with_workers(key_hash)
+
 if st.button("🚀 **Run OCR Processing**", use_container_width=True):
     st.session_state.results.clear()
+    st.session_state.search_index = None
+    for store in (artifact_store, image_store, served_store()):
+        store.release_session(session_id)
+    st.session_state.export = None
+    st.session_state.preview_urls = {}
     sources = uploaded_files if input_type == "Upload Files" else urls
 
     if not sources or (isinstance(sources, list) and not any(sources)):
@@ -303,217 +422,459 @@ if st.button("🚀 **Run OCR Processing**", use_container_width=True):
         st.warning("⚠️ Please provide valid input")
         st.stop()
 
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    with st.status("📊 **Processing files...**", expanded=True) as status:
-        for i, src in enumerate(sources):
-            # ---------- LOCAL FILE ----------
-            if input_type == "Upload Files":
-                file_bytes = src.read()
-                preview = encode_file(file_bytes, src.type)
-                document = {
-                    "type": "document_url" if "pdf" in src.type else "image_url",
-                    "document_url" if "pdf" in src.type else "image_url": preview
-                }
-                name = src.name
-                status.update(label=f"🔍 Processing: {name}")
-
-            # ---------- URL ----------
-            else:
-                src = src.strip()
-                if not src:
-                    continue
-                
-                document = {
-                    "type": "document_url" if is_pdf(src) else "image_url",
-                    "document_url" if is_pdf(src) else "image_url": src
-                }
-                preview = src
-                name = src.split("/")[-1]
-                status.update(label=f"🌐 Processing: {name}")
+    def file_spec(src):
+        src.seek(0)
+        ref = artifact_store.put_stream(src, "." + src.name.rsplit(".", 1)[-1].lower())
+        artifact_store.claim(ref, session_id)
+        return {"kind": "path", "name": src.name, "source": artifact_store.path(ref), "mime": src.type,
+                "preview": to_ref(ref), "sha256": ref.split(".")[0], "stream": stream_pdfs and "pdf" in src.type,
+                "preprocess": preprocess if is_image(src.type) else None}
 
-            try:
-                text = run_ocr(api_key, document)
-                lang = detect_language(text)
-                status.update(label=f"✅ Completed: {name}")
-            except Exception as e:
-                text = f"Error: {e}"
-                lang = "unknown"
-                status.update(label=f"❌ Error: {name}")
-
-            st.session_state.results.append({
-                "name": name,
-                "preview": preview,
-                "text": text,
-                "language": lang
-            })
-
-            progress_bar.progress((i + 1) / len(sources))
-            time.sleep(0.3)
-
-        status.update(label="✅ **Processing complete!**", state="complete")
-    
+    def url_spec(resolved):
+        # The digest is only used to spot duplicates here; workers revalidate the URL before OCR.
+        return {"kind": "url", "name": resolved["name"], "source": resolved["url"], "mime": resolved["mime"],
+                "preview": resolved["url"], "stream": stream_pdfs and "pdf" in resolved["mime"],
+                "digest": resolved["digest"]}
+
+    if input_type == "Upload Files":
+        specs = [file_spec(src) for src in sources]
+    else:
+        with st.spinner("🔗 Checking URLs..."):
+            specs = [url_spec(r) for r in resolve_urls(sources)]
+    # Repeated files become duplicate jobs that take the first copy's result instead of calling OCR again.
+    for spec, original in zip(specs, duplicate_plan([spec_fingerprint(s) for s in specs], near_duplicates)):
+        spec["duplicate_of"] = original
+    batch_id = job_queue.submit(key_hash, session_id, specs, include_images)
+    for spec in specs:
+        if spec["kind"] == "path":
+            artifact_store.claim(from_ref(spec["preview"]), batch_owner(batch_id))
+    ensure_workers(api_key, workers)
+    st.session_state.batch_id = batch_id
+    st.query_params["batch"] = batch_id
+
+# ================= BATCH PROGRESS =================
+def load_batch(batch_id):
+    batch = job_queue.batch(batch_id)
+    records = job_queue.results(batch_id)
+    speed = st.session_state.speed
+    # Reopening a batch shows its results again but must not count its pages and time twice.
+    counted = batch_id in speed["batches"]
+    speed["batches"].add(batch_id)
+    for record in records:
+        elapsed = record.pop("elapsed")
+        if elapsed is not None and not counted:
+            speed["latency"].record("document", elapsed)
+        if is_ref(record["preview"]):
+            artifact_store.claim(from_ref(record["preview"]), session_id)
+        claim_images(record.get("images"), session_id)
+    if not counted:
+        if batch["last_finished"]:
+            speed["seconds"] += max(0.0, batch["last_finished"] - batch["created"])
+        speed["pages"] += sum(len(r["page_offsets"] or []) for r in records)
+    st.session_state.results = [from_json(r) for r in records]
+    st.session_state.search_index = None
+    st.session_state.loaded_batch = batch_id
+    st.session_state.export = None
+    st.session_state.duplicates = batch["counts"].get("duplicate", 0)
+
+JOB_ICONS = {"queued": "🕒", "running": "⏳", "done": "✅", "failed": "❌", "cancelled": "🚫", "duplicate": "♻️"}
+
+@st.fragment(run_every=JOB_UI_REFRESH)
+def batch_progress(batch_id):
+    # Polls the job queue; the work itself runs in the worker processes, so closing the tab loses nothing.
+    batch = job_queue.batch(batch_id)
+    share_with_workers(batch["key_hash"])
+    if batch["complete"]:
+        load_batch(batch_id)
+        st.session_state.celebrate = True
+        st.rerun()
+
+    counts = batch["counts"]
+    st.progress(
+        batch["finished"] / batch["total"],
+        text=f"📊 Processed {batch['finished']}/{batch['total']} file(s) · "
+             f"{counts.get('running', 0)} running · {counts.get('queued', 0)} queued · "
+             f"{counts.get('duplicate', 0)} duplicate(s) skipped"
+    )
+    jobs = job_queue.jobs(batch_id)
+    for job in jobs:
+        total = f"/{job['page_count']}" if job["page_count"] else ""
+        pages = f" · {job['pages']}{total} page(s)" if job["pages"] else ""
+        retry = f" · attempt {job['attempts']}" if job["attempts"] > 1 else ""
+        same = f" · same as {jobs[job['duplicate_of']]['name']}" if job["duplicate_of"] is not None else ""
+        st.write(f"{JOB_ICONS[job['status']]} {job['name']}{pages}{retry}{same}")
+        if job["live"]:
+            with st.expander(f"📑 {job['name']}", expanded=True):
+                st.markdown(job["live"])
+    if counts.get("queued") and st.button("🛑 Cancel queued files", key=f"cancel_{batch_id}"):
+        job_queue.cancel(batch_id)
+
+if "batch_id" not in st.session_state:
+    st.session_state.batch_id = st.query_params.get("batch")
+
+recent = job_queue.batches(key_hash)
+if recent:
+    with st.expander("🗂️ Recent batches"):
+        for b in recent:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                state = "complete" if b["complete"] else f"{b['finished']}/{b['total']} done"
+                st.markdown(f"**{time.strftime('%Y-%m-%d %H:%M', time.localtime(b['created']))}** · "
+                            f"{b['total']} file(s) · {state}")
+            with col2:
+                if st.button("Open", key=f"open_batch_{b['id']}", disabled=b["id"] == st.session_state.batch_id):
+                    st.session_state.batch_id = b["id"]
+                    st.query_params["batch"] = b["id"]
+                    st.rerun()
+
+batch_id = st.session_state.batch_id
+if batch_id and batch_id != st.session_state.get("loaded_batch"):
+    batch = job_queue.batch(batch_id)
+    if batch is None or batch["key_hash"] != key_hash:
+        st.session_state.batch_id = None
+    elif batch["complete"]:
+        load_batch(batch_id)
+        show_speed()
+    else:
+        st.markdown("### ⏳ Processing")
+        batch_progress(batch_id)
+
+if st.session_state.pop("celebrate", False):
     st.balloons()
     st.success(f"✨ Successfully processed {len(st.session_state.results)} file(s)")
+    if st.session_state.get("duplicates"):
+        st.info(f"♻️ {st.session_state.duplicates} duplicate file(s) reused an earlier result: "
+                f"{st.session_state.duplicates} OCR call(s) avoided")
 
 # ================= RESULTS DISPLAY =================
-if st.session_state.results:
-    st.markdown("### 📊 Processing Results")
-    st.markdown(f"**Total files processed:** {len(st.session_state.results)}")
-    
-    for idx, r in enumerate(st.session_state.results):
-        st.markdown("---")
-        
-        # File header with language badge
-        col1, col2, col3 = st.columns([3, 1, 1])
-        with col1:
-            st.markdown(f"### 📄 {r['name']}")
-        
-        with col2:
-            language_code = r["language"]
-            language_name = LANGUAGE_MAP.get(language_code, "Unknown")
-            st.markdown(f'<div class="language-badge">🌍 {language_name}</div>', unsafe_allow_html=True)
-        
-        with col3:
-            with st.popover("📁 Quick Actions"):
-                st.download_button(
-                    label="📥 Download Text",
-                    data=r["text"],
-                    file_name=f"{r['name']}.txt",
-                    mime="text/plain",
-                    key=f"dl_txt_{idx}"
-                )
+def render_hits(index, hits, key):
+    # Shows one page of highlighted snippets plus a wider view of the selected match.
+    pages = max(1, -(-len(hits) // SEARCH_SNIPPETS_PER_PAGE))
+    nav_col, jump_col = st.columns(2)
+    with nav_col:
+        page = st.number_input("Results page", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    with jump_col:
+        match = st.number_input("Jump to match", min_value=1, max_value=len(hits), value=1, key=f"{key}_match")
+
+    first = (page - 1) * SEARCH_SNIPPETS_PER_PAGE
+    for n, hit in enumerate(hits[first:first + SEARCH_SNIPPETS_PER_PAGE], start=first + 1):
+        st.markdown(
+            f"<small><b>#{n}</b> · {index.names[hit.doc]} · page {hit.page}</small><br>{index.snippet(hit)}",
+            unsafe_allow_html=True
+        )
+
+    hit = hits[match - 1]
+    with st.container(border=True):
+        st.caption(f"Match #{match} of {len(hits)} · {index.names[hit.doc]} · page {hit.page}")
+        st.markdown(
+            f"<div style='white-space: pre-wrap; font-family: monospace; font-size: 14px;'>"
+            f"{index.snippet(hit, context=600)}</div>",
+            unsafe_allow_html=True
+        )
+
+@st.fragment
+def render_export():
+    with st.expander("📦 Export all results"):
+        archive_col, formats_col = st.columns([1, 3])
+        with archive_col:
+            archive = st.radio("Archive", ["zip", "jsonl"], format_func=str.upper, key="export_archive",
+                               help="JSONL holds one JSON record per document")
+        with formats_col:
+            formats = st.multiselect("Formats in the ZIP", EXPORT_FORMATS, default=["txt", "json"],
+                                     format_func=str.upper, key="export_formats", disabled=archive == "jsonl")
+        count = len(st.session_state.results)
+        if not st.get_option("server.enableStaticServing"):
+            # Download buttons keep their payload in Streamlit's in-memory media store, so this path is capped.
+            too_many = count > EXPORT_MEMORY_MAX_DOCS
+            if too_many:
+                st.caption(f"Exports of more than {EXPORT_MEMORY_MAX_DOCS} results need "
+                           "`server.enableStaticServing`, so the archive is served from disk.")
+            st.download_button(
+                f"📥 Download {count} result(s) as {archive.upper()}",
+                data=partial(export_bytes, list(st.session_state.results), archive, formats),
+                file_name=f"ocr_results.{archive}",
+                mime=MIME_TYPES[archive],
+                disabled=(archive == "zip" and not formats) or too_many,
+                use_container_width=True
+            )
+            return
+        # Written document by document into the served export folder, so the archive never sits in memory.
+        settings = {"archive": archive, "formats": formats if archive == "zip" else None, "count": count}
+        if st.button(f"📦 Prepare {count} result(s) as {archive.upper()}", disabled=archive == "zip" and not formats,
+                     use_container_width=True):
+            with st.spinner("Writing archive..."):
+                ref = export_file(list(st.session_state.results), archive, formats)
+            served_store().claim(ref, session_id)
+            st.session_state.export = {"settings": settings, "ref": ref}
+        # A prepared archive is offered only while it matches the current results and choices.
+        prepared = st.session_state.get("export")
+        if prepared and prepared["settings"] == settings and served_store().exists(prepared["ref"]):
+            st.markdown(f"<a href='{served_url(prepared['ref'])}' download='ocr_results.{archive}'>"
+                        f"📥 Download ocr_results.{archive}</a>", unsafe_allow_html=True)
+
+@st.fragment
+def render_search():
+    search_index = st.session_state.search_index
+    with st.expander("🔎 Search all documents"):
+        query_col, regex_col = st.columns([4, 1])
+        with query_col:
+            query = st.text_input("Search", placeholder="Case-insensitive search across every result",
+                                  key="global_search", label_visibility="collapsed")
+        with regex_col:
+            use_regex = st.checkbox("Regex", key="global_search_regex")
+        if query:
+            try:
+                start = time.perf_counter()
+                hits = search_index.search(query, regex=use_regex)
+                elapsed = time.perf_counter() - start
+            except re.error as e:
+                st.error(f"Invalid regular expression: {e}")
+                hits = None
+            if hits:
+                counts = search_index.counts(hits)
+                st.caption(f"{len(hits)} match(es) in {len(counts)} document(s) · {elapsed * 1000:.1f} ms")
+                for doc, entry in counts.items():
+                    pages = ", ".join(f"p{p}: {n}" for p, n in sorted(entry["pages"].items()))
+                    st.markdown(f"- **{search_index.names[doc]}**: {entry['total']} ({pages})")
+                render_hits(search_index, hits, "global_hits")
+            elif hits is not None:
+                st.info("No matches")
+
+def pdf_preview_url(ref: str) -> str:
+    # Served from disk by URL, so a rerun sends a short link whatever the PDF's size. Without static serving
+    # the data URL is built once per file and kept for the session, though each rerun still sends it.
+    if st.get_option("server.enableStaticServing"):
+        served_store().link(ref, artifact_store.path(ref))
+        served_store().claim(ref, session_id)
+        return served_url(ref)
+    urls = st.session_state.setdefault("preview_urls", {})
+    if ref not in urls:
+        urls[ref] = artifact_store.data_url(ref, "application/pdf")
+    return urls[ref]
+
+@st.fragment
+def render_result(idx):
+    # Widgets in one panel rerun only that panel, not the sidebar, the CSS or the other results.
+    start = time.perf_counter()
+    r = st.session_state.results[idx]
+    search_index = st.session_state.search_index
+    # File header with language badge
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        st.markdown(f"### 📄 {r['name']}")
+        if r.get("duplicate_of"):
+            st.caption(f"♻️ Same content as {r['duplicate_of']}, OCR reused")
+
+    with col2:
+        language_code = r["language"]
+        language_name = LANGUAGE_MAP.get(language_code, "Unknown")
+        st.markdown(f'<div class="language-badge">🌍 {language_name}</div>', unsafe_allow_html=True)
+        distribution = (r.get("languages") or {}).get("distribution", {})
+        if len(distribution) > 1:
+            st.caption(" · ".join(
+                f"{LANGUAGE_MAP.get(code, code)} {share:.0%}" for code, share in distribution.items()
+            ))
+
+    with col3:
+        with st.popover("📁 Quick Actions"):
+            # Payloads are built by the callables only when a button is clicked.
+            for fmt, label in (("txt", "Text"), ("md", "Markdown"), ("docx", "Word"), ("json", "JSON")):
                 st.download_button(
-                    label="📥 Download JSON",
-                    data=json.dumps(r, indent=2),
-                    file_name=f"{r['name']}.json",
-                    mime="application/json",
-                    key=f"dl_json_{idx}"
+                    label=f"📥 Download {label}",
+                    data=partial(export_payload, r, fmt),
+                    file_name=f"{r['name']}.{fmt}",
+                    mime=MIME_TYPES[fmt],
+                    key=f"dl_{fmt}_{idx}"
                 )
-        
-        # Tabs for different views
-        tab1, tab2, tab3, tab4 = st.tabs(
-            ["👁️ Preview", "📝 Extracted Text", "🧠 AI Summary", "❓ Q&A"]
-        )
-        
-        # ---------- PREVIEW ----------
-        with tab1:
-            if r["preview"].endswith(".pdf") or "application/pdf" in r["preview"]:
+
+    # Tabs for different views
+    tab1, tab2, tab3, tab4 = st.tabs(
+        ["👁️ Preview", "📝 Extracted Text", "🧠 AI Summary", "❓ Q&A"]
+    )
+
+    # ---------- PREVIEW ----------
+    with tab1:
+        preview = r["preview"]
+        mime = r.get("mime")
+        # The type sniffed at ingestion decides; only records saved before it was kept fall back to the name.
+        is_pdf_preview = "pdf" in mime if mime else preview.endswith(".pdf") or "application/pdf" in preview
+
+        if not preview:
+            st.info("No preview available for this file")
+        elif is_pdf_preview and not st.toggle("📄 Load document preview", key=f"show_preview_{idx}"):
+            # The viewer is only sent when asked for, so idle reruns don't pay for it.
+            st.caption(f"{len(r.get('pages') or [])} page(s) · toggle to open the viewer")
+        else:
+            if is_ref(preview):
+                ref = from_ref(preview)
+                if not artifact_store.exists(ref):
+                    preview = ""
+                elif is_pdf_preview:
+                    preview = pdf_preview_url(ref)
+                else:
+                    preview = artifact_store.path(ref)
+
+            if not preview:
+                st.info("This preview has expired")
+            elif is_pdf_preview:
+                start_page = st.number_input("Open at page", min_value=1, max_value=max(1, len(r.get("pages") or [])),
+                                             value=1, key=f"preview_page_{idx}")
                 st.markdown(
-                    f"<iframe src='{r['preview']}' width='100%' height='700' style='border-radius: 10px;'></iframe>",
+                    f"<iframe src='{preview}#page={start_page}' width='100%' height='700' style='border-radius: 10px;'></iframe>",
                     unsafe_allow_html=True
                 )
+            elif mime and not mime.startswith("image/"):
+                st.info(f"No preview available for {mime} files")
             else:
-                st.image(r["preview"])
-        
-        # ---------- EXTRACTED TEXT ----------
-        with tab2:
-            search_col, export_col = st.columns([3, 1])
-            with search_col:
-                search = st.text_input(
-                    "🔍 Search in text",
-                    placeholder="Type to search...",
-                    key=f"search_{idx}"
-                )
-            
-            with export_col:
-                st.download_button(
-                    "📥 Export as Markdown",
-                    data=r["text"],
-                    file_name=f"{r['name']}.md",
-                    mime="text/markdown",
-                    use_container_width=True
-                )
-            
-            # Display text with highlighting
-            text_display = r["text"]
-            if search:
-                text_display = text_display.replace(
-                    search, 
-                    f"<mark style='background-color: #ffeb3b;'>{search}</mark>"
-                )
-            
-            st.markdown(
-                f"""
-                <div style='
-                    background: #f8f9fa;
-                    color: #333;
-                    padding: 20px;
-                    border-radius: 10px;
-                    max-height: 500px;
-                    overflow-y: auto;
-                    font-family: monospace;
-                    font-size: 14px;
-                    line-height: 1.6;
-                    white-space: pre-wrap;
-                '>
-                    {text_display}
-                </div>
-                """,
-                unsafe_allow_html=True
+                st.image(preview)
+
+    # ---------- EXTRACTED TEXT ----------
+    with tab2:
+        search_col, export_col = st.columns([3, 1])
+        with search_col:
+            search = st.text_input(
+                "🔍 Search in text",
+                placeholder="Type to search...",
+                key=f"search_{idx}"
             )
-            
-            st.caption(f"📏 Character count: {len(r['text']):,}")
-        
-        # ---------- SUMMARY ----------
-        with tab3:
-            if st.button("✨ Generate Summary", key=f"sum_{idx}", use_container_width=True):
-                with st.spinner("🤖 Generating summary..."):
-                    summary = summarize_text(api_key, r["text"])
-                    st.markdown(
-                        f"""
-                        <div style='
-                            background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-                            color: #333;
-                            padding: 25px;
-                            border-radius: 10px;
-                            border-left: 5px solid #667eea;
-                        '>
-                            <h4 style='margin-top: 0;'>📋 AI Summary</h4>
-                            {summary}
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-                    st.download_button(
-                        "📥 Download Summary",
-                        data=summary,
-                        file_name=f"{r['name']}_summary.txt",
-                        mime="text/plain",
-                        key=f"dl_sum_{idx}"
-                    )
+
+        with export_col:
+            st.download_button(
+                "📥 Export as Markdown",
+                data=partial(export_payload, r, "md"),
+                file_name=f"{r['name']}.md",
+                mime=MIME_TYPES["md"],
+                key=f"dl_text_md_{idx}",
+                use_container_width=True
+            )
+
+        if search:
+            hits = search_index.search(search, doc=idx)
+            if hits:
+                st.caption(f"🔍 {len(hits)} match(es) on {len(search_index.counts(hits)[idx]['pages'])} page(s)")
+                render_hits(search_index, hits, f"hits_{idx}")
             else:
-                st.info("Click the button above to generate an AI summary of the extracted text")
-        
-        # ---------- Q&A ----------
-        with tab4:
-            question = st.text_input(
-                "💭 Ask a question about the document:",
-                placeholder="What is the main topic of this document?",
-                key=f"q_{idx}"
+                st.info("No matches")
+
+        pages = r.get("pages") or []
+        if pages:
+            page_col, window_col = st.columns([3, 1])
+            with window_col:
+                window = st.selectbox("Pages per view", PAGE_WINDOW_SIZES, key=f"window_{idx}")
+            with page_col:
+                first_page = st.number_input(f"Page (of {len(pages)})", min_value=1, max_value=len(pages),
+                                             value=1, step=window, key=f"text_page_{idx}")
+            visible = pages[first_page - 1:first_page - 1 + window]
+            text_display = "\n\n".join(p.markdown(r["text"]) for p in visible)
+        else:
+            visible = []
+            text_display = r["text"]
+
+        st.markdown(
+            f"""
+            <div style='
+                background: #f8f9fa;
+                color: #333;
+                padding: 20px;
+                border-radius: 10px;
+                max-height: 500px;
+                overflow-y: auto;
+                font-family: monospace;
+                font-size: 14px;
+                line-height: 1.6;
+                white-space: pre-wrap;
+            '>
+                {text_display}
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+        for p in visible:
+            st.caption(
+                f"📄 Page {p.number}: {p.chars:,} characters · {p.words:,} words · "
+                f"{LANGUAGE_MAP.get(p.language, p.language)}"
+            )
+        st.caption(f"📏 Character count: {len(r['text']):,}")
+
+        if r.get("images") and st.toggle("🖼️ Show embedded images", key=f"img_{idx}"):
+            for p in visible or [PageRecord(1, 0, 0, 0)]:
+                images = page_images(r["images"], p.number)
+                if not images:
+                    st.info(f"No embedded images on page {p.number}")
+                for image_id, path in images:
+                    st.image(path, caption=f"Page {p.number} · {image_id}")
+
+    # ---------- SUMMARY ----------
+    with tab3:
+        summary = cached_summary(r["text"])
+        if summary is None and st.button("✨ Generate Summary", key=f"sum_{idx}", use_container_width=True):
+            with st.container(border=True):
+                st.markdown("#### 📋 AI Summary")
+                with st.spinner("🤖 Summarizing document sections..."):
+                    stream = summarize_text_stream(api_key, r["text"], split_pages(r["text"], r.get("page_offsets")))
+                    first = next(stream, "")
+                summary = st.write_stream(chain([first], stream))
+        elif summary is not None:
+            with st.container(border=True):
+                st.markdown("#### 📋 AI Summary")
+                st.markdown(summary)
+
+        if summary is not None:
+            st.download_button(
+                "📥 Download Summary",
+                data=summary,
+                file_name=f"{r['name']}_summary.txt",
+                mime="text/plain",
+                key=f"dl_sum_{idx}"
             )
-            
-            if question:
+        else:
+            st.info("Click the button above to generate an AI summary of the extracted text")
+
+    # ---------- Q&A ----------
+    with tab4:
+        question = st.text_input(
+            "💭 Ask a question about the document:",
+            placeholder="What is the main topic of this document?",
+            key=f"q_{idx}"
+        )
+
+        if question:
+            with st.container(border=True):
+                st.markdown(f"**❓ {html.escape(question)}**")
                 with st.spinner("🤖 Thinking..."):
-                    answer = qa_text(api_key, r["text"], question)
-                    st.markdown(
-                        f"""
-                        <div style='
-                            background: linear-gradient(135deg, #e3f2fd 0%, #bbdefb 100%);
-                            color: #333;
-                            padding: 25px;
-                            border-radius: 10px;
-                            margin-top: 20px;
-                        '>
-                            <h4 style='margin-top: 0; color: #003366'>❓ Your Question</h4>
-                            <p style='background: white; padding: 10px; border-radius: 5px;'>{question}</p>
-                            <h4 style='margin-top: 20px; color: #003366'>🤖 Answer</h4>
-                            <p style='background: white; color: #006699; padding: 15px; border-radius: 5px; font-size: 16px;'>{answer}</p>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
+                    stream = qa_text_stream(api_key, r["text"], question)
+                    first = next(stream, "")
+                answer = st.write_stream(chain([first], stream))
+            st.download_button(
+                "📥 Download Answer",
+                data=f"Question:\n{question}\n\nAnswer:\n{answer}",
+                file_name=f"{r['name']}_answer.txt",
+                mime="text/plain",
+                key=f"dl_qa_{idx}"
+            )
+            if len(r["text"]) > RETRIEVAL_CHUNK_CHARS * RETRIEVAL_TOP_K:
+                index = get_index(r["text"])
+                st.caption(
+                    f"📚 Answered from the top {RETRIEVAL_TOP_K} of {len(index.chunks)} passages "
+                    f"({RETRIEVAL_CHUNK_CHARS} chars each) · index built in {index.build_time * 1000:.0f} ms"
+                )
+
+    metrics.record("app.panel_render", time.perf_counter() - start)
+
+if st.session_state.results:
+    st.markdown("### 📊 Processing Results")
+    st.markdown(f"**Total files processed:** {len(st.session_state.results)}")
+
+    if st.session_state.get("search_index") is None:
+        st.session_state.search_index = SearchIndex(st.session_state.results)
+
+    render_export()
+    render_search()
+    for idx in range(len(st.session_state.results)):
+        st.markdown("---")
+        render_result(idx)
+    metrics.record("app.rerun", time.perf_counter() - script_start)
 
 # Empty state when no results
 elif api_key:
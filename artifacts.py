@@ -0,0 +1,194 @@
+import base64
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from config import CACHE_DIR, ARTIFACT_MAX_AGE, ARTIFACT_SESSION_TTL, ARTIFACT_CLEANUP_INTERVAL, SERVED_DIR, SERVED_URL
+
+CHUNK_CHARS = 4 * 256 * 1024
+CHUNK_BYTES = 3 * 256 * 1024
+REF_PREFIX = "artifact:"
+
+def is_ref(value: str) -> bool:
+    return value.startswith(REF_PREFIX)
+
+def to_ref(ref: str) -> str:
+    return REF_PREFIX + ref
+
+def from_ref(value: str) -> str:
+    return value[len(REF_PREFIX):]
+
+class ArtifactStore:
+    def __init__(self, root: str, index: str | None = None):
+        # index holds the owners table; it lives outside root when root is served to browsers.
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self._db = sqlite3.connect(index or os.path.join(root, "owners.sqlite3"), check_same_thread=False,
+                                   isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS owners ("
+            "ref TEXT NOT NULL, session TEXT NOT NULL, touched REAL NOT NULL, PRIMARY KEY (ref, session))"
+        )
+
+    def path(self, ref: str) -> str:
+        return os.path.join(self.root, ref[:2], ref)
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self.path(ref))
+
+    def _commit(self, tmp_path: str, digest: str, suffix: str) -> str:
+        ref = digest + suffix
+        target = self.path(ref)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+        return ref
+
+    def put(self, data: bytes, suffix: str = "") -> str:
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return self._commit(tmp_path, hashlib.sha256(data).hexdigest(), suffix)
+
+    def put_stream(self, fileobj, suffix: str = "") -> str:
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(fd, "wb") as f:
+            while chunk := fileobj.read(CHUNK_BYTES):
+                digest.update(chunk)
+                f.write(chunk)
+        return self._commit(tmp_path, digest.hexdigest(), suffix)
+
+    def put_file(self, write, suffix: str = "") -> str:
+        # write(fileobj) produces the content straight into the store; it is hashed afterwards in slices.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        try:
+            with os.fdopen(fd, "w+b") as f:
+                write(f)
+                f.seek(0)
+                digest = hashlib.sha256()
+                while chunk := f.read(CHUNK_BYTES):
+                    digest.update(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return self._commit(tmp_path, digest.hexdigest(), suffix)
+
+    def link(self, ref: str, source: str) -> str:
+        # Makes a file from another store available under the same ref, hard-linked so nothing is copied.
+        target = self.path(ref)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = os.path.join(self.root, uuid.uuid4().hex)
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path)  # different filesystem
+            os.replace(tmp_path, target)
+        return ref
+
+    def put_base64(self, payload: str, suffix: str = "") -> str:
+        # Accepts raw base64 or a data URL and decodes it to disk in bounded slices.
+        if payload.startswith("data:"):
+            header, _, payload = payload.partition(",")
+            suffix = suffix or "." + header[5:].split(";")[0].split("/")[-1]
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(fd, "wb") as f:
+            for start in range(0, len(payload), CHUNK_CHARS):
+                chunk = base64.b64decode(payload[start:start + CHUNK_CHARS])
+                digest.update(chunk)
+                f.write(chunk)
+        return self._commit(tmp_path, digest.hexdigest(), suffix)
+
+    def open_mmap(self, ref: str) -> mmap.mmap:
+        with open(self.path(ref), "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, ref: str) -> bytes:
+        with open(self.path(ref), "rb") as f:
+            return f.read()
+
+    def data_url(self, ref: str, mime: str) -> str:
+        # Encoded slice by slice from the mapping, so only the resulting string is held in memory.
+        if os.path.getsize(self.path(ref)) == 0:
+            return f"data:{mime};base64,"
+        with self.open_mmap(ref) as mapped:
+            parts = [base64.b64encode(mapped[i:i + CHUNK_BYTES]).decode() for i in range(0, len(mapped), CHUNK_BYTES)]
+        return f"data:{mime};base64,{''.join(parts)}"
+
+    def claim(self, ref: str, session: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO owners (ref, session, touched) VALUES (?, ?, ?)",
+                             (ref, session, time.time()))
+
+    def touch_session(self, session: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE owners SET touched = ? WHERE session = ?", (time.time(), session))
+
+    def release_session(self, session: str) -> None:
+        with self._lock:
+            refs = [r for (r,) in self._db.execute("SELECT ref FROM owners WHERE session = ?", (session,))]
+            self._db.execute("DELETE FROM owners WHERE session = ?", (session,))
+        for ref in refs:
+            self._delete_if_unowned(ref)
+
+    def _delete_if_unowned(self, ref: str) -> None:
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM owners WHERE ref = ?", (ref,)).fetchone():
+                return
+        try:
+            os.remove(self.path(ref))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self, max_age: float = ARTIFACT_MAX_AGE, session_ttl: float = ARTIFACT_SESSION_TTL) -> int:
+        # Sessions not seen for session_ttl lose their claims; unclaimed files older than that go,
+        # and anything older than max_age goes regardless.
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM owners WHERE touched < ?", (now - session_ttl,))
+            owned = {r for (r,) in self._db.execute("SELECT DISTINCT ref FROM owners")}
+        removed = 0
+        for folder in os.scandir(self.root):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                age = now - entry.stat().st_mtime
+                if age > max_age or (entry.name not in owned and age > session_ttl):
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def maybe_cleanup(self, interval: float = ARTIFACT_CLEANUP_INTERVAL) -> None:
+        now = time.monotonic()
+        if now - self._last_cleanup >= interval:
+            self._last_cleanup = now
+            self.cleanup()
+
+artifact_store = ArtifactStore(os.path.join(CACHE_DIR, "artifacts"))
+
+_served_store = None
+_served_store_lock = threading.Lock()
+
+def served_store() -> ArtifactStore:
+    # Files under SERVED_DIR are downloaded by the browser straight from disk. Created on first use, so the
+    # CLIs never create the folder; its owners table stays out of the served folder.
+    global _served_store
+    with _served_store_lock:
+        if _served_store is None:
+            _served_store = ArtifactStore(SERVED_DIR, os.path.join(CACHE_DIR, "served.sqlite3"))
+        return _served_store
+
+def served_url(ref: str) -> str:
+    return f"{SERVED_URL}/{ref[:2]}/{ref}"
@@ -0,0 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def run_batch(items, worker, max_workers: int = 4):
+    # Yields (index, result, error) in completion order; callers slot results back by index.
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(worker, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+def run_ordered(items, worker, max_workers: int = 4) -> list:
+    results = [None] * len(items)
+    for i, result, error in run_batch(items, worker, max_workers):
+        results[i] = error if error is not None else result
+    return results
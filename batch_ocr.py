@@ -0,0 +1,163 @@
+"""Headless batch OCR.
+
+    python batch_ocr.py scans/ "invoices/*.pdf" https://example.com/a.pdf --out results.jsonl --workers 8
+    python batch_ocr.py --urls urls.txt --out results.jsonl
+
+Each finished document is appended to the JSONL output with the same fields the
+app keeps in ``st.session_state.results``. Re-running with the same ``--out``
+resumes: documents already in the file are skipped and failed ones are retried.
+"""
+import argparse
+import glob
+import json
+import mimetypes
+import os
+import sys
+import time
+from batch import run_batch
+from config import SUPPORTED_FILES, OCR_MAX_WORKERS, PREPROCESS_MAX_PIXELS, PREPROCESS_JPEG_QUALITY
+from preprocess import preprocess_options, is_image
+from dedupe import duplicate_plan, fan_out
+from models import to_json
+from ocr_service import ocr_cache
+from pipeline import path_source, url_source, ocr_source, error_result
+from remote import resolve_urls
+from telemetry import configure as configure_telemetry
+
+def is_url(value: str) -> bool:
+    return value.startswith(("http://", "https://"))
+
+def is_supported(path: str) -> bool:
+    return os.path.isfile(path) and path.rsplit(".", 1)[-1].lower() in SUPPORTED_FILES
+
+def collect_sources(inputs: list[str], url_file: str | None, pattern: str) -> list[str]:
+    sources = []
+    for value in inputs:
+        if is_url(value):
+            sources.append(value)
+        elif os.path.isdir(value):
+            sources.extend(sorted(p for p in glob.glob(os.path.join(value, pattern), recursive=True) if is_supported(p)))
+        else:
+            sources.extend(sorted(p for p in glob.glob(value, recursive=True) if is_supported(p)))
+    if url_file:
+        with open(url_file) as f:
+            sources.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return list(dict.fromkeys(sources))
+
+def load_checkpoint(out_path: str) -> set[str]:
+    # The output file is the checkpoint: keep finished records, drop failed ones so they are retried.
+    if not os.path.exists(out_path):
+        return set()
+    kept = []
+    with open(out_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a partial line from an interrupted write
+            if not record["text"].startswith("Error:"):
+                kept.append(line if line.endswith("\n") else line + "\n")
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(kept)
+    os.replace(tmp_path, out_path)
+    return {json.loads(line)["preview"] for line in kept}
+
+def make_source(path_or_url: str, preprocess: dict | None = None) -> dict:
+    if is_url(path_or_url):
+        return url_source(path_or_url)
+    mime = mimetypes.guess_type(path_or_url)[0] or "application/octet-stream"
+    return path_source(os.path.basename(path_or_url), path_or_url, mime, preprocess=preprocess)
+
+def prepare_source(path: str, preprocess: dict | None) -> dict | None:
+    try:
+        return make_source(path, preprocess)
+    except OSError:
+        return None  # reported for this document when it is processed
+
+def fingerprint(path_or_url: str, source: dict | None) -> tuple[str, str | None]:
+    if source is None:
+        return path_or_url, None
+    return source["digest"], source["path"] if "path" in source and is_image(source["mime"]) else None
+
+def process(api_key: str, path_or_url: str, include_images: bool, preprocess: dict | None = None) -> dict:
+    return ocr_source(api_key, make_source(path_or_url, preprocess), include_images)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Mistral OCR over a batch of files or URLs.")
+    parser.add_argument("inputs", nargs="*", help="files, directories, glob patterns or URLs")
+    parser.add_argument("--urls", help="text file with one URL per line")
+    parser.add_argument("--glob", default="**/*", help="pattern used inside directories (default: %(default)s)")
+    parser.add_argument("--out", default="results.jsonl", help="JSONL output and checkpoint file")
+    parser.add_argument("--workers", type=int, default=OCR_MAX_WORKERS)
+    parser.add_argument("--include-images", action="store_true")
+    parser.add_argument("--preprocess", action="store_true", help="shrink JPG/PNG inputs before upload")
+    parser.add_argument("--max-megapixels", type=float, default=PREPROCESS_MAX_PIXELS / 1e6)
+    parser.add_argument("--quality", type=int, default=PREPROCESS_JPEG_QUALITY, help="JPEG quality after preprocessing")
+    parser.add_argument("--color", action="store_true", help="keep colour instead of converting to grayscale")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="also reuse OCR for rescans and resized copies of the same image")
+    parser.add_argument("--no-dedupe", action="store_true", help="OCR every input, even identical ones")
+    parser.add_argument("--api-key", default=os.environ.get("MISTRAL_API_KEY"))
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("set MISTRAL_API_KEY or pass --api-key")
+    print(f"telemetry: {configure_telemetry()}", file=sys.stderr)
+    sources = collect_sources(args.inputs, args.urls, args.glob)
+    done = load_checkpoint(args.out)
+    pending = [s for s in sources if s not in done]
+    print(f"{len(sources)} source(s), {len(sources) - len(pending)} already done, {len(pending)} to process",
+          file=sys.stderr)
+
+    start = time.perf_counter()
+    pages = errors = 0
+    preprocess = preprocess_options(max_pixels=int(args.max_megapixels * 1e6), grayscale=not args.color,
+                                    quality=args.quality) if args.preprocess else None
+    # Local files are hashed and URLs resolved up front, so duplicates are known before any OCR call.
+    urls = [s for s in pending if is_url(s)]
+    resolved = dict(zip(urls, resolve_urls(urls)))
+    prepared = {s: url_source(s, resolved[s]) if is_url(s) else prepare_source(s, preprocess) for s in pending}
+    plan = [None] * len(pending) if args.no_dedupe else \
+        duplicate_plan([fingerprint(s, prepared[s]) for s in pending], args.near_duplicates)
+    copies = {}
+    for i, original in enumerate(plan):
+        if original is not None:
+            copies.setdefault(original, []).append(i)
+    unique = [i for i, original in enumerate(plan) if original is None]
+
+    def ocr(i):
+        source = prepared[pending[i]] or make_source(pending[i], preprocess)
+        return ocr_source(args.api_key, source, args.include_images)
+
+    count = 0
+    with open(args.out, "a") as out:
+        for position, result, error in run_batch(unique, ocr, args.workers):
+            i = unique[position]
+            if error is not None:
+                result = error_result(os.path.basename(pending[i]), pending[i], error)
+            for j in [i] + copies.get(i, []):
+                record = result if j == i else fan_out(result, os.path.basename(pending[j]), pending[j])
+                out.write(json.dumps(to_json(record)) + "\n")
+                count += 1
+                failed = record["text"].startswith("Error:")
+                errors += failed
+                pages += len(record["page_offsets"] or [])
+                status = "FAIL" if failed else "ok  " if j == i else "dup "
+                print(f"[{count}/{len(pending)}] {status} {pending[j]}", file=sys.stderr)
+            out.flush()
+
+    elapsed = time.perf_counter() - start
+    stats = ocr_cache.stats()
+    print(
+        f"\nprocessed {len(pending)} document(s), {pages} page(s), {errors} error(s) in {elapsed:.1f} s\n"
+        f"throughput: {len(pending) / elapsed if elapsed else 0:.2f} docs/s, "
+        f"{pages / elapsed * 60 if elapsed else 0:.1f} pages/min\n"
+        f"OCR cache: {stats['hits']} hit(s), {stats['misses']} miss(es)\n"
+        f"duplicates: {len(pending) - len(unique)} OCR call(s) avoided",
+        file=sys.stderr
+    )
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Per-call latency of a new Mistral client per call versus the pooled registry.
+
+    MISTRAL_API_KEY=... python benchmarks/bench_client_pool.py --calls 20
+
+Each call is a lightweight ``models.list()`` request. Without a valid key the
+API answers 401, which still measures connection setup plus one round trip.
+The cold case times client construction, the TCP/TLS handshake and the first
+request; the warm case reuses a pooled client whose connection was opened by
+an untimed request beforehand.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mistralai import Mistral
+from clients import get_client, close_all
+from config import MISTRAL_SERVER_URL
+
+
+def call(client) -> None:
+    try:
+        client.models.list()
+    except Exception:
+        pass
+
+
+def timed_call(client) -> float:
+    start = time.perf_counter()
+    call(client)
+    return time.perf_counter() - start
+
+
+def cold_call(api_key: str) -> float:
+    start = time.perf_counter()
+    with Mistral(api_key=api_key, server_url=MISTRAL_SERVER_URL) as client:
+        call(client)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+    api_key = os.environ.get("MISTRAL_API_KEY", "invalid-key")
+
+    fresh = [cold_call(api_key) for _ in range(args.calls)]
+    call(get_client(api_key))  # opens the pooled connection, as the app's first request does
+    pooled = [timed_call(get_client(api_key)) for _ in range(args.calls)]
+    close_all()
+
+    for label, samples in (("new client per call", fresh), ("pooled client", pooled)):
+        print(f"{label:>20}: median {statistics.median(samples) * 1000:7.1f} ms, "
+              f"mean {statistics.mean(samples) * 1000:7.1f} ms")
+    saved = statistics.median(fresh) - statistics.median(pooled)
+    print(f"{'saved per call':>20}: {saved * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
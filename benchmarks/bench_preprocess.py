@@ -0,0 +1,180 @@
+"""Bytes saved, latency and OCR agreement of the image preprocessing stage.
+
+    python benchmarks/bench_preprocess.py --photos 8 --scans 4 --bandwidth 2e6
+    MISTRAL_API_KEY=... python benchmarks/bench_preprocess.py --real --images "samples/*.jpg"
+
+Without --images, synthetic inputs are generated: 12 MP phone photos (JPEG,
+half of them with an EXIF rotation) and 600-DPI A4 page scans (PNG), both
+carrying lines of text. Each image is OCR'd twice, at full size and
+preprocessed, and the two texts are compared word by word.
+
+The local mock server returns the same text for any image, so similarity is
+only meaningful with --real; latency there reflects upload size through the
+--bandwidth limit plus preprocessing time.
+"""
+import argparse
+import difflib
+import glob
+import mimetypes
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from PIL import Image, ImageDraw, ImageFont
+
+WORDS = ("invoice total amount contract party delivery warranty clause payment "
+         "schedule signature date liability termination notice section annex").split()
+
+
+def text_image(size: tuple[int, int], mode: str, rng: random.Random, font_size: int) -> Image.Image:
+    image = Image.new(mode, size, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+    y = font_size * 2
+    while y < size[1] - font_size * 2:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 9)))
+        draw.text((font_size * 2, y), line, fill="black", font=font)
+        y += int(font_size * 1.6)
+    return image
+
+
+def synthesize(folder: str, photos: int, scans: int, scan_dpi: int) -> list[str]:
+    rng = random.Random(0)
+    paths = []
+    for i in range(photos):
+        image = text_image((4032, 3024), "RGB", rng, 72)
+        # Sensor noise, so the JPEG is as large as a real photo rather than a flat synthetic page.
+        noise = Image.effect_noise(image.size, 24).convert("RGB")
+        image = Image.blend(image, noise, 0.15)
+        exif = Image.Exif()
+        if i % 2:
+            exif[0x0112] = 6
+            image = image.rotate(90, expand=True)
+        path = os.path.join(folder, f"photo{i}.jpg")
+        image.save(path, "JPEG", quality=92, exif=exif)
+        paths.append(path)
+    for i in range(scans):
+        size = (round(8.27 * scan_dpi), round(11.69 * scan_dpi))
+        path = os.path.join(folder, f"scan{i}.png")
+        text_image(size, "RGB", rng, scan_dpi // 6).save(path, "PNG", dpi=(scan_dpi, scan_dpi))
+        paths.append(path)
+    return paths
+
+
+def similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a.lower().split(), b.lower().split(), autojunk=False).ratio()
+
+
+def start_mock(bandwidth: float, latency: float) -> tuple[subprocess.Popen, str]:
+    import socket
+    import urllib.request
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen([sys.executable, str(ROOT / "benchmarks" / "mock_server.py"), "--port", str(port),
+                               "--pages", "1", "--latency", str(latency), "--bandwidth", str(bandwidth)])
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/v1/models", timeout=1).close()
+            return server, url
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("mock server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="glob of real JPG/PNG inputs instead of synthetic ones")
+    parser.add_argument("--photos", type=int, default=6)
+    parser.add_argument("--scans", type=int, default=2)
+    parser.add_argument("--scan-dpi", type=int, default=600)
+    parser.add_argument("--max-megapixels", type=float, default=4.0)
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--color", action="store_true", help="keep colour instead of converting to grayscale")
+    parser.add_argument("--bandwidth", type=float, default=2e6, help="mock upload bytes per second")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock OCR latency in seconds")
+    parser.add_argument("--real", action="store_true", help="use the Mistral API (MISTRAL_API_KEY) instead of the mock")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="preprocess-bench-")
+    cache_dir = tempfile.mkdtemp(prefix="ocr-bench-")
+    os.environ["MISTRAL_OCR_CACHE_DIR"] = cache_dir
+    server = None
+    if args.real:
+        api_key = os.environ.get("MISTRAL_API_KEY")
+        if not api_key:
+            parser.error("--real needs MISTRAL_API_KEY")
+    else:
+        api_key = "bench"
+        server, os.environ["MISTRAL_SERVER_URL"] = start_mock(args.bandwidth, args.latency)
+
+    from ocr_service import ocr_pages, join_pages
+    from pipeline import path_source, bind_document
+    from batch import run_ordered
+    from config import PREPROCESS_WORKERS
+    from preprocess import preprocess_options, preprocess_file, preprocess_path
+
+    try:
+        paths = sorted(glob.glob(args.images)) if args.images else synthesize(folder, args.photos, args.scans, args.scan_dpi)
+        options = preprocess_options(max_pixels=int(args.max_megapixels * 1e6), grayscale=not args.color,
+                                     quality=args.quality)
+
+        start = time.perf_counter()
+        serial = [preprocess_file(p, options) for p in paths]
+        serial_time = time.perf_counter() - start
+        # As in the app: request threads hand each image to the shared process pool.
+        pooled_run = lambda batch: run_ordered(batch, lambda path: preprocess_path(path, options), PREPROCESS_WORKERS)
+        os.remove(pooled_run(paths[:1])[0][0])  # start the pool before timing it
+        start = time.perf_counter()
+        pooled = pooled_run(paths)
+        pool_time = time.perf_counter() - start
+        for out_path, _, _, _ in serial + pooled:
+            os.remove(out_path)
+
+        def ocr(path, preprocess):
+            mime = mimetypes.guess_type(path)[0]
+            source = path_source(os.path.basename(path), path, mime, preprocess=preprocess)
+            start = time.perf_counter()
+            text = join_pages(ocr_pages(api_key, bind_document(api_key, source), source["digest"]))[0]
+            return text, time.perf_counter() - start
+
+        print(f"{'image':>12} {'pixels':>9} {'in KB':>8} {'out KB':>8} {'saved':>6} "
+              f"{'full s':>7} {'prep s':>7} {'similarity':>10}")
+        rows = []
+        for path, (_, _, size_in, size_out) in zip(paths, pooled):
+            with Image.open(path) as image:
+                pixels = image.width * image.height
+            full_text, full_time = ocr(path, None)
+            prep_text, prep_time = ocr(path, options)
+            rows.append((size_in, size_out, full_time, prep_time, similarity(full_text, prep_text)))
+            print(f"{os.path.basename(path):>12} {pixels / 1e6:>8.1f}M {size_in / 1024:>8.0f} {size_out / 1024:>8.0f} "
+                  f"{1 - size_out / size_in:>6.0%} {full_time:>7.2f} {prep_time:>7.2f} {rows[-1][4]:>10.3f}")
+
+        total_in = sum(r[0] for r in rows)
+        total_out = sum(r[1] for r in rows)
+        print(f"\nbytes: {total_in / 2**20:.1f} MiB -> {total_out / 2**20:.1f} MiB ({1 - total_out / total_in:.0%} saved)")
+        print(f"end-to-end p50: full {statistics.median(r[2] for r in rows):.2f} s, "
+              f"preprocessed {statistics.median(r[3] for r in rows):.2f} s")
+        print(f"text similarity: mean {statistics.mean(r[4] for r in rows):.3f}, min {min(r[4] for r in rows):.3f}"
+              + ("" if args.real else " (mock server, not meaningful)"))
+        print(f"preprocessing {len(paths)} image(s): serial {serial_time:.2f} s, process pool {pool_time:.2f} s")
+    finally:
+        if server is not None:
+            server.terminate()
+        shutil.rmtree(folder, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
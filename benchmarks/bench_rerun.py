@@ -0,0 +1,136 @@
+"""Cost of a widget interaction in the results view, before and after fragment isolation.
+
+    python benchmarks/bench_rerun.py --docs 1 5 10 20 --pages 20
+
+The interaction is typing a query into the first result's search box. Before,
+that reran the whole script: sidebar, CSS, search panel and every result. With
+each panel in its own st.fragment, Streamlit reruns only that panel. Both are
+timed here on the same session: "full rerun" runs the script with the new
+widget value, "fragment" sends the same value as a fragment-scoped rerun of
+the panel that owns the search box, as the browser does.
+
+AppTest always reruns the whole script and forgets fragments between runs, so
+the script is driven through its local runner with one fragment store shared
+across runs.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from streamlit.proto.WidgetStates_pb2 import WidgetStates
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.fragment import MemoryFragmentStorage
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+from streamlit.runtime.state.safe_session_state import SafeSessionState
+from streamlit.runtime.state.session_state import SessionState
+from streamlit.testing.v1.element_tree import parse_tree_from_messages
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas
+from streamlit.testing.v1.util import patch_config_options
+
+from ocr_service import join_pages
+from pipeline import make_result
+
+SCRIPT = str(ROOT / "app.py")
+
+
+def synthetic_results(docs: int, pages: int) -> list[dict]:
+    rng = random.Random(0)
+    vocab = [f"word{i}" for i in range(2000)]
+    results = []
+    for d in range(docs):
+        text, offsets = join_pages([" ".join(rng.choice(vocab) for _ in range(400)) for _ in range(pages)])
+        languages = {"language": "en", "pages": ["en"] * pages, "distribution": {"en": pages}}
+        source = {"name": f"doc{d}.pdf", "preview": "", "document": None, "digest": None}
+        results.append(make_result(source, text, offsets, languages))
+    return results
+
+
+class Session:
+    # One browser session: session state and fragments outlive each script run, as in a served app.
+    def __init__(self):
+        self.session_state = SafeSessionState(SessionState(), lambda: None)
+        self.fragments = MemoryFragmentStorage()
+        self.tree = None
+
+    def run(self, widget_state=None, fragment_id: str | None = None) -> float:
+        runtime = MagicMock(spec=Runtime)
+        runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+        runtime.cache_storage_manager = MemoryCacheStorageManager()
+        Runtime._instance = runtime
+        runner = LocalScriptRunner(SCRIPT, self.session_state, PagesManager(SCRIPT, ScriptCache(), setup_watcher=False))
+        runner._fragment_storage = self.fragments
+        rerun = RerunData(widget_states=widget_state, fragment_id_queue=[fragment_id] if fragment_id else [],
+                          is_fragment_scoped_rerun=fragment_id is not None)
+        try:
+            with patch_config_options({"global.appTest": True}):
+                start = time.perf_counter()
+                runner.request_rerun(rerun)
+                runner.start()
+                require_widgets_deltas(runner, 120)
+                elapsed = time.perf_counter() - start
+        finally:
+            Runtime._instance = None
+        if fragment_id is None:
+            self.tree = parse_tree_from_messages(runner.forward_msgs())
+            self.tree._runner = self
+            self.owners = {
+                msg.delta.new_element.text_input.id: msg.delta.fragment_id
+                for msg in runner.forward_msgs()
+                if msg.HasField("delta") and msg.delta.new_element.HasField("text_input")
+            }
+        return elapsed
+
+    def widget_states(self, key: str, value: str) -> WidgetStates:
+        # The browser sends every widget's current value along with the one that changed.
+        states = WidgetStates()
+        for state in self.session_state.get_widget_states():
+            if state.id.endswith(f"-{key}"):
+                state.string_value = value
+            states.widgets.append(state)
+        return states
+
+    def owner(self, key: str) -> str:
+        return next(fragment for widget, fragment in self.owners.items() if widget.endswith(key) and fragment)
+
+
+def bench(docs: int, pages: int, repeats: int) -> dict:
+    session = Session()
+    session.session_state["results"] = synthetic_results(docs, pages)
+    session.run()
+    session.tree.text_input[0].set_value("bench-key")
+    session.run(session.tree.get_widget_states())
+    fragment = session.owner("search_0")
+    full, scoped = [], []
+    for i in range(repeats):
+        full.append(session.run(session.widget_states("search_0", f"word{i}")))
+        scoped.append(session.run(session.widget_states("search_0", f"word{i + repeats}"), fragment))
+    return {"full": statistics.median(full), "fragment": statistics.median(scoped)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'docs':>6} {'full rerun ms':>14} {'fragment ms':>12} {'speedup':>8}")
+    for docs in args.docs:
+        r = bench(docs, args.pages, args.repeats)
+        print(f"{docs:>6} {r['full'] * 1000:>14.1f} {r['fragment'] * 1000:>12.1f} {r['full'] / r['fragment']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
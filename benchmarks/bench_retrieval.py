@@ -0,0 +1,75 @@
+"""Prompt size and latency of retrieval-based Q&A versus the full-text prompt.
+
+    python benchmarks/bench_retrieval.py --file extracted.txt --question "What is the total?"
+
+Without --file a synthetic multi-page document is used. When MISTRAL_API_KEY is
+set both prompts are also sent to MODEL_LLM and the billed prompt tokens and
+response latency are reported.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import MODEL_LLM, RETRIEVAL_CHUNK_CHARS, RETRIEVAL_TOP_K
+from retrieval import RetrievalIndex
+
+
+def synthetic_document(pages: int) -> str:
+    topics = ["payment terms", "delivery schedule", "warranty", "liability", "termination", "invoice totals"]
+    return "\n\n".join(
+        f"Page {p}. This section covers {topics[p % len(topics)]}. "
+        + " ".join(f"Clause {p}.{c} describes {topics[(p + c) % len(topics)]} in detail." for c in range(40))
+        for p in range(pages)
+    )
+
+
+def ask(client, context: str, question: str):
+    start = time.perf_counter()
+    res = client.chat.complete(
+        model=MODEL_LLM,
+        messages=[
+            {"role": "system", "content": "Answer the question based on the provided text"},
+            {"role": "user", "content": f"Text:\n{context}\n\nQuestion:\n{question}"}
+        ]
+    )
+    return res.usage.prompt_tokens, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--question", default="What are the warranty terms?")
+    parser.add_argument("--chunk-size", type=int, default=RETRIEVAL_CHUNK_CHARS)
+    parser.add_argument("-k", type=int, default=RETRIEVAL_TOP_K)
+    args = parser.parse_args()
+
+    text = Path(args.file).read_text() if args.file else synthetic_document(args.pages)
+    index = RetrievalIndex(text, args.chunk_size)
+    start = time.perf_counter()
+    context = index.context(args.question, args.k)
+    query_time = time.perf_counter() - start
+
+    print(f"document: {len(text):,} chars, {len(index.chunks)} chunks of <= {args.chunk_size} chars")
+    print(f"index build: {index.build_time * 1000:.1f} ms, top-{args.k} query: {query_time * 1000:.2f} ms")
+    print(f"prompt chars: full {len(text):,} vs retrieval {len(context):,} "
+          f"({len(context) / max(len(text), 1):.1%})")
+
+    api_key = os.environ.get("MISTRAL_API_KEY")
+    if api_key:
+        from clients import get_client
+        client = get_client(api_key)
+        for label, ctx in (("full text", text), ("retrieval", context)):
+            try:
+                tokens, latency = ask(client, ctx, args.question)
+                print(f"{label:>10}: {tokens:,} prompt tokens, {latency:.2f} s")
+            except Exception as e:
+                print(f"{label:>10}: failed ({e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Index build and query times of the cross-document search index.
+
+    python benchmarks/bench_search.py --docs 50 --pages 40
+    python benchmarks/bench_search.py --jsonl results.jsonl
+
+The naive baseline is what the Extracted Text tab used to do on every rerun:
+a case-sensitive str.replace over each document's full text.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ocr_service import join_pages
+from search_index import SearchIndex, load_jsonl
+
+WORDS = ("invoice total amount contract party delivery warranty clause payment "
+         "schedule signature date liability termination notice section annex").split()
+
+
+def word(rng: random.Random) -> str:
+    # Mostly random tokens so trigram statistics resemble real text, with some domain words mixed in.
+    if rng.random() < 0.2:
+        return rng.choice(WORDS)
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9)))
+
+
+def synthetic_results(docs: int, pages: int) -> list[dict]:
+    rng = random.Random(0)
+    results = []
+    for d in range(docs):
+        text, offsets = join_pages([" ".join(word(rng) for _ in range(400)) for _ in range(pages)])
+        results.append({"name": f"doc{d}.pdf", "text": text, "page_offsets": offsets})
+    return results
+
+
+def timed(fn, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jsonl")
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=40)
+    args = parser.parse_args()
+
+    results = load_jsonl(args.jsonl) if args.jsonl else synthetic_results(args.docs, args.pages)
+    chars = sum(len(r["text"]) for r in results)
+    index = SearchIndex(results)
+    print(f"{len(results)} document(s), {len(index.units)} page(s), {chars:,} chars")
+    print(f"index build: {index.build_time * 1000:.1f} ms, {len(index.postings):,} trigrams")
+
+    queries = [("rare literal", "liability termination notice", False),
+               ("common word", "invoice", False),
+               ("regex", r"sign\w+ date", True)]
+    for label, query, regex in queries:
+        hits = index.search(query, regex=regex)
+        elapsed = timed(lambda: index.search(query, regex=regex))
+        print(f"{label:>14}: {elapsed * 1000:8.2f} ms, {len(hits):,} hit(s)")
+
+    naive = timed(lambda: [r["text"].replace("invoice", "<mark>invoice</mark>") for r in results])
+    print(f"{'naive replace':>14}: {naive * 1000:8.2f} ms (per rerun, before rendering)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""End-to-end performance suite against the local mock Mistral server.
+
+    python benchmarks/bench_suite.py --docs 20 --pages 10 --latency 0.05 --page-latency 0.01
+    python benchmarks/bench_suite.py --baseline benchmarks/results/suite-20261018-120000.json
+
+Scenarios drive the real client code: ``run_ocr`` over inline documents,
+``summarize_text`` and ``qa_text`` over OCR-sized texts, and the batch
+pipeline (``batch_ocr.process`` through ``run_batch`` into JSONL). Each one
+reports throughput, p50/p95/p99 latency per operation and peak traced Python
+memory. The mock runs in its own process so its allocations are not counted,
+and every run uses a fresh cache directory so all calls go to the server.
+
+Results are written as JSON. With ``--baseline`` the run is compared against
+an earlier file and exits non-zero when throughput drops or p95 latency grows
+by more than ``--tolerance``.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(args) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    server = subprocess.Popen([
+        sys.executable, str(ROOT / "benchmarks" / "mock_server.py"), "--port", str(port),
+        "--latency", str(args.latency), "--page-latency", str(args.page_latency), "--jitter", str(args.jitter),
+        "--pages", str(args.pages), "--page-chars", str(args.page_chars), "--answer-words", str(args.answer_words),
+        "--throttle", str(args.throttle), "--error-rate", str(args.error_rate), "--retry-after", "0.2",
+    ])
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/v1/models", timeout=1).close()
+            return server, url
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("mock server did not start")
+
+
+def percentiles(samples: list[float]) -> dict:
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def measure(items: list, fn, workers: int, units) -> dict:
+    # fn(item) -> result; units(result) counts pages/answers so throughput is comparable across sizes.
+    from batch import run_batch
+
+    def timed(item):
+        start = time.perf_counter()
+        result = fn(item)
+        return time.perf_counter() - start, result
+
+    latencies, count, errors = [], 0, 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _, value, error in run_batch(items, timed, workers):
+        if error is not None:
+            errors += 1
+            continue
+        latency, result = value
+        latencies.append(latency)
+        count += units(result)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "ops": len(items),
+        "errors": errors,
+        "units": count,
+        "seconds": elapsed,
+        "ops_per_second": len(items) / elapsed if elapsed else 0.0,
+        "units_per_second": count / elapsed if elapsed else 0.0,
+        **percentiles(latencies),
+        "peak_mib": peak / 2**20,
+    }
+
+
+def unique_pdf(i: int, size: int) -> bytes:
+    # Random bytes are enough: the mock ignores content, and distinct bytes mean distinct cache keys.
+    return f"%PDF-1.4 bench {i}\n".encode() + os.urandom(size)
+
+
+def run_suite(args) -> dict:
+    from batch_ocr import process
+    from llm_service import llm_cache, summarize_text, qa_text
+    from models import to_json
+    from ocr_service import ocr_cache, run_ocr, split_pages
+    from utils import detect_language
+
+    api_key = "bench"
+    detect_language("warm up the language profiles before measuring")
+    scenarios = {}
+
+    docs = [{"type": "document_url",
+             "document_url": "data:application/pdf;base64," + base64.b64encode(unique_pdf(i, args.doc_kb * 1024)).decode()}
+            for i in range(args.docs)]
+    texts = []
+
+    def ocr(document):
+        text = run_ocr(api_key, document)
+        texts.append(text)
+        return text
+
+    ocr_cache.clear()
+    scenarios["ocr"] = measure(docs, ocr, args.workers, lambda text: text.count("# Page "))
+    scenarios["ocr"]["unit"] = "pages"
+
+    # Summaries and answers are keyed by text, so each document is made distinct before the LLM stages.
+    texts = [f"{text}\n\nDocument {i}" for i, text in enumerate(texts)]
+    llm_cache.clear()
+    scenarios["summarize"] = measure(texts, lambda text: summarize_text(api_key, text, split_pages(text, None)),
+                                     args.workers, lambda summary: 1)
+    scenarios["summarize"]["unit"] = "summaries"
+
+    questions = [(texts[i % len(texts)], f"What does page {i % args.pages + 1} say about item {i}?")
+                 for i in range(args.questions)]
+    scenarios["qa"] = measure(questions, lambda q: qa_text(api_key, *q), args.workers, lambda answer: 1)
+    scenarios["qa"]["unit"] = "answers"
+
+    batch_dir = tempfile.mkdtemp(prefix="ocr-bench-batch-")
+    try:
+        paths = []
+        for i in range(args.docs):
+            path = os.path.join(batch_dir, f"doc{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(unique_pdf(args.docs + i, args.doc_kb * 1024))
+            paths.append(path)
+        out = open(os.path.join(batch_dir, "results.jsonl"), "w")
+
+        def pipeline(path):
+            result = process(api_key, path, False)
+            if result["text"].startswith("Error:"):
+                raise RuntimeError(result["text"])
+            out.write(json.dumps(to_json(result)) + "\n")
+            return result
+
+        ocr_cache.clear()
+        with out:
+            scenarios["batch"] = measure(paths, pipeline, args.workers, lambda result: len(result["page_offsets"] or []))
+        scenarios["batch"]["unit"] = "pages"
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+    return scenarios
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if now["units_per_second"] < before["units_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['units_per_second']:.2f} -> {now['units_per_second']:.2f} {now['unit']}/s")
+        if now["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95'] * 1000:.0f} -> {now['p95'] * 1000:.0f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10, help="pages per mock OCR document")
+    parser.add_argument("--doc-kb", type=int, default=64, help="size of each generated input file")
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--page-latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--page-chars", type=int, default=2000)
+    parser.add_argument("--answer-words", type=int, default=50)
+    parser.add_argument("--throttle", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--out", default=str(ROOT / "benchmarks" / "results"), help="directory for result files")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default: %(default)s)")
+    args = parser.parse_args()
+
+    server, url = start_mock(args)
+    os.environ["MISTRAL_SERVER_URL"] = url
+    cache_dir = tempfile.mkdtemp(prefix="ocr-bench-")
+    os.environ["MISTRAL_OCR_CACHE_DIR"] = cache_dir
+    try:
+        scenarios = run_suite(args)
+    finally:
+        server.terminate()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    from config import RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, MAX_CONCURRENT_REQUESTS
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "tolerance")},
+        "client": {"rate_limit_per_second": RATE_LIMIT_PER_SECOND, "rate_limit_burst": RATE_LIMIT_BURST,
+                   "max_concurrent_requests": MAX_CONCURRENT_REQUESTS},
+        "scenarios": scenarios,
+    }
+
+    print(f"{'scenario':>10} {'ops':>5} {'err':>4} {'throughput':>20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MiB':>9}")
+    for name, s in scenarios.items():
+        throughput = f"{s['units_per_second']:.2f} {s['unit']}/s"
+        print(f"{name:>10} {s['ops']:>5} {s['errors']:>4} {throughput:>20} {s['p50'] * 1000:>8.0f} "
+              f"{s['p95'] * 1000:>8.0f} {s['p99'] * 1000:>8.0f} {s['peak_mib']:>9.1f}")
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(scenarios, json.load(f)["scenarios"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
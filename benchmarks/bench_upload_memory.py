@@ -0,0 +1,84 @@
+"""Peak Python memory of the inline data-URL upload path versus the streamed file upload.
+
+    python benchmarks/bench_upload_memory.py --size-mb 50
+
+Both paths send a random file of the given size to a mock server started in a
+separate process, so only client-side allocations are measured (tracemalloc).
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure(fn) -> tuple[float, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=20)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, str(ROOT / "benchmarks" / "mock_server.py"),
+                               "--port", str(port), "--latency", "0"])
+    os.environ["MISTRAL_SERVER_URL"] = f"http://127.0.0.1:{port}"
+    cache_dir = tempfile.mkdtemp(prefix="ocr-bench-")
+    os.environ["MISTRAL_OCR_CACHE_DIR"] = cache_dir
+    time.sleep(1)
+
+    from ocr_service import ocr_cache
+    from pipeline import file_source, path_source, ocr_source
+    from utils import detect_language
+
+    size = int(args.size_mb * 1024 * 1024)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(os.urandom(size))
+        path = f.name
+    detect_language("warm up the language profiles before measuring")
+
+    def inline_path():
+        ocr_cache.clear()
+        with open(path, "rb") as f:
+            file_bytes = f.read()
+        ocr_source("bench", file_source("doc.pdf", file_bytes, "application/pdf"))
+
+    def streamed_path():
+        ocr_cache.clear()
+        ocr_source("bench", path_source("doc.pdf", path, "application/pdf"))
+
+    try:
+        print(f"file size: {size / 2**20:.1f} MiB")
+        for label, fn in (("inline data URL", inline_path), ("streamed upload", streamed_path)):
+            peak, elapsed = measure(fn)
+            print(f"{label:>16}: peak {peak / 2**20:7.1f} MiB ({peak / size:4.1f}x file), {elapsed:.2f} s")
+    finally:
+        server.terminate()
+        os.remove(path)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
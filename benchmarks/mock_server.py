@@ -0,0 +1,229 @@
+"""Local stand-in for the Mistral OCR and chat endpoints.
+
+    python benchmarks/mock_server.py --port 8765 --throttle 0.3 --retry-after 1
+    MISTRAL_SERVER_URL=http://127.0.0.1:8765 python batch_ocr.py scans/ --api-key test
+
+Responses follow the shapes the mistralai SDK parses. ``--throttle`` and
+``--error-rate`` make a fraction of requests fail with 429 (with Retry-After)
+or 503, to exercise the request scheduler. ``--page-latency``, ``--jitter``,
+``--page-chars`` and ``--answer-words`` shape OCR cost and payload sizes;
+``--bandwidth`` throttles uploads to the files endpoint.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockSettings:
+    def __init__(self, latency=0.05, pages=5, throttle=0.0, error_rate=0.0, retry_after=1.0,
+                 page_latency=0.0, jitter=0.0, page_chars=800, answer_words=3, bandwidth=0.0):
+        self.latency = latency
+        self.pages = pages
+        self.throttle = throttle
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.page_latency = page_latency
+        self.jitter = jitter
+        self.page_chars = page_chars
+        self.answer_words = answer_words
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def delay(settings: MockSettings, pages: int = 0) -> None:
+    time.sleep(settings.latency + settings.page_latency * pages + random.uniform(0, settings.jitter))
+
+
+def page_markdown(settings: MockSettings, i: int) -> str:
+    line = f"Mock OCR text for page {i + 1}. "
+    header = f"# Page {i + 1}\n\n"
+    return header + (line * (settings.page_chars // len(line) + 1))[:max(0, settings.page_chars - len(header))]
+
+
+def answer_words(settings: MockSettings) -> list[str]:
+    words = ["Mock ", "streamed ", "answer. "]
+    return [words[i % len(words)] for i in range(max(1, settings.answer_words))]
+
+
+def ocr_response(settings: MockSettings, body: dict) -> tuple[int, dict]:
+    requested = body.get("pages")
+    if requested is None:
+        requested = list(range(settings.pages))
+    if any(i >= settings.pages for i in requested):
+        return 422, {"detail": f"page index out of range, document has {settings.pages} pages"}
+    pages = [
+        {
+            "index": i,
+            "markdown": page_markdown(settings, i),
+            "images": [],
+            "dimensions": {"dpi": 200, "height": 2200, "width": 1700},
+        }
+        for i in requested
+    ]
+    return 200, {"pages": pages, "model": body.get("model"), "usage_info": {"pages_processed": len(pages)}}
+
+
+def usage(body: dict, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def chat_completion(settings: MockSettings, body: dict) -> dict:
+    return {
+        "id": "mock-chat",
+        "object": "chat.completion",
+        "model": body.get("model"),
+        "created": int(time.time()),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(answer_words(settings))}, "finish_reason": "stop"}],
+        "usage": usage(body, settings.answer_words),
+    }
+
+
+def chat_chunks(settings: MockSettings, body: dict):
+    words = answer_words(settings)
+    for i, word in enumerate(words):
+        yield {
+            "id": "mock-chat",
+            "object": "chat.completion.chunk",
+            "model": body.get("model"),
+            "created": int(time.time()),
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": word},
+                         "finish_reason": "stop" if i == len(words) - 1 else None}],
+            **({"usage": usage(body, len(words))} if i == len(words) - 1 else {}),
+        }
+
+
+def make_handler(settings: MockSettings):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _fault(self) -> bool:
+            roll = random.random()
+            if roll < settings.throttle:
+                self._send_json(429, {"message": "Requests rate limit exceeded"},
+                                {"Retry-After": str(settings.retry_after)})
+                return True
+            if roll < settings.throttle + settings.error_rate:
+                self._send_json(503, {"message": "Service unavailable"})
+                return True
+            return False
+
+        def do_DELETE(self):
+            if self.path.startswith("/v1/files/"):
+                file_id = self.path.rsplit("/", 1)[-1]
+                self._send_json(200, {"id": file_id, "object": "file", "deleted": True})
+            else:
+                self._send_json(404, {"message": "not found"})
+
+        def _upload(self, length: int):
+            # Drains the multipart body in slices, like a real upload endpoint would.
+            remaining = length
+            while remaining > 0:
+                received = len(self.rfile.read(min(remaining, 1 << 20)))
+                remaining -= received
+                if settings.bandwidth:
+                    time.sleep(received / settings.bandwidth)
+            self._send_json(200, {
+                "id": f"file-{uuid.uuid4().hex}",
+                "object": "file",
+                "bytes": length,
+                "created_at": int(time.time()),
+                "filename": "upload",
+                "purpose": "ocr",
+                "sample_type": "ocr_input",
+                "source": "upload",
+            })
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/v1/models":
+                self._send_json(200, {"object": "list", "data": []})
+            else:
+                self._send_json(404, {"message": "not found"})
+
+        def do_POST(self):
+            with settings.lock:
+                settings.requests += 1
+            length = int(self.headers.get("Content-Length") or 0)
+            if self.path == "/v1/files":
+                delay(settings)
+                self._upload(length)
+                return
+            body = json.loads(self.rfile.read(length) or b"{}")
+            pages = len(body.get("pages") or range(settings.pages)) if self.path == "/v1/ocr" else 0
+            delay(settings, pages)
+            if self._fault():
+                return
+
+            if self.path == "/v1/ocr":
+                self._send_json(*ocr_response(settings, body))
+            elif self.path == "/v1/chat/completions" and body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for chunk in chat_chunks(settings, body):
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            elif self.path == "/v1/chat/completions":
+                self._send_json(200, chat_completion(settings, body))
+            else:
+                self._send_json(404, {"message": "not found"})
+
+    return Handler
+
+
+def serve(settings: MockSettings, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    # Starts the server on a background thread; port 0 picks a free port (see server.server_address).
+    server = ThreadingHTTPServer((host, port), make_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    parser.add_argument("--pages", type=int, default=5, help="pages per OCR document")
+    parser.add_argument("--throttle", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--page-latency", type=float, default=0.0, help="extra OCR seconds per page")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform random extra latency, in seconds")
+    parser.add_argument("--page-chars", type=int, default=800, help="markdown characters per OCR page")
+    parser.add_argument("--answer-words", type=int, default=3, help="words per chat answer")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="upload bytes per second, 0 for unlimited")
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency, args.pages, args.throttle, args.error_rate, args.retry_after,
+                            args.page_latency, args.jitter, args.page_chars, args.answer_words,
+                            args.bandwidth)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(settings))
+    server.daemon_threads = True
+    print(f"mock Mistral API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import threading
+import time
+import httpx
+from mistralai import Mistral
+from mistralai._hooks.tracing import TracingHook
+from cache import content_hash
+from config import CLIENT_MAX_CONNECTIONS, CLIENT_MAX_KEEPALIVE, CLIENT_TIMEOUT, CLIENT_IDLE_TTL, MISTRAL_SERVER_URL
+
+_clients = {}
+_lock = threading.Lock()
+
+def _new_client(api_key: str):
+    http = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=CLIENT_MAX_KEEPALIVE,
+            keepalive_expiry=CLIENT_IDLE_TTL,
+        ),
+        timeout=httpx.Timeout(CLIENT_TIMEOUT, connect=10.0),
+    )
+    client = Mistral(api_key=api_key, client=http, server_url=MISTRAL_SERVER_URL, timeout_ms=int(CLIENT_TIMEOUT * 1000))
+    _disable_sdk_tracing(client)
+    return client, http
+
+def _disable_sdk_tracing(client: Mistral) -> None:
+    # The SDK traces itself whenever a global tracer provider is set, keeping one open span per client.
+    # Pooled clients serve many threads at once, so those spans end twice, and multipart uploads fail
+    # to trace at all. The pipeline's own spans already cover every API call.
+    hooks = client.sdk_configuration.__dict__["_hooks"]
+    for hook in hooks.before_request_hooks + hooks.after_success_hooks + hooks.after_error_hooks:
+        if isinstance(hook, TracingHook):
+            hook.tracing_enabled = False
+
+def get_client(api_key: str) -> Mistral:
+    now = time.monotonic()
+    # Keyed by a hash so raw API keys are not kept as dict keys.
+    key = content_hash(api_key)
+    with _lock:
+        _close_idle(now)
+        entry = _clients.get(key)
+        if entry is None:
+            client, http = _new_client(api_key)
+            entry = _clients[key] = {"client": client, "http": http, "last_used": now}
+        entry["last_used"] = now
+        return entry["client"]
+
+def _close_idle(now: float) -> None:
+    for key in [k for k, e in _clients.items() if now - e["last_used"] > CLIENT_IDLE_TTL]:
+        _clients.pop(key)["http"].close()
+
+def close_all() -> None:
+    with _lock:
+        for entry in _clients.values():
+            entry["http"].close()
+        _clients.clear()
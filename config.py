@@ -1,3 +1,85 @@
+import os
+
 MODEL_OCR = "mistral-ocr-latest"
 MODEL_LLM = "mistral-small"
-SUPPORTED_FILES = ["pdf", "png", "jpg", "jpeg"]
\ No newline at end of file
+SUPPORTED_FILES = ["pdf", "png", "jpg", "jpeg"]
+
+CACHE_DIR = os.environ.get("MISTRAL_OCR_CACHE_DIR", ".cache")
+OCR_CACHE_MAX_BYTES = 256 * 1024 * 1024
+OCR_CACHE_TTL = 7 * 24 * 3600
+
+OCR_MAX_WORKERS = 4
+
+CLIENT_MAX_CONNECTIONS = 20
+CLIENT_MAX_KEEPALIVE = 10
+CLIENT_TIMEOUT = 120.0
+CLIENT_IDLE_TTL = 15 * 60
+
+OCR_PAGE_CHUNK = 8
+STREAM_PREVIEW_PAGES = 3
+
+RETRIEVAL_CHUNK_CHARS = 1500
+RETRIEVAL_TOP_K = 5
+
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+LLM_CACHE_TTL = 30 * 24 * 3600
+SUMMARY_CHUNK_CHARS = 12000
+SUMMARY_MAX_WORKERS = 4
+
+MISTRAL_SERVER_URL = os.environ.get("MISTRAL_SERVER_URL") or None
+RATE_LIMIT_PER_SECOND = 5.0
+RATE_LIMIT_BURST = 10
+MAX_CONCURRENT_REQUESTS = 8
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_MAX = 60.0
+
+ARTIFACT_MAX_AGE = 24 * 3600
+ARTIFACT_SESSION_TTL = 2 * 3600
+ARTIFACT_CLEANUP_INTERVAL = 10 * 60
+
+LANG_SAMPLE_CHARS = 1200
+LANG_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+SEARCH_SNIPPETS_PER_PAGE = 10
+SEARCH_SNIPPET_CONTEXT = 80
+PAGE_WINDOW_SIZES = [1, 2, 5, 10]
+
+TELEMETRY_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "mistral-ocr-pro")
+TELEMETRY_DIR = os.path.join(CACHE_DIR, "telemetry")
+TELEMETRY_EXPORT_INTERVAL_MS = 30000
+
+JOB_DB = os.path.join(CACHE_DIR, "jobs.sqlite3")
+JOB_WORKERS = max(2, min(8, os.cpu_count() or 2))
+JOB_POLL_INTERVAL = 0.5
+JOB_HEARTBEAT = 10.0
+JOB_LEASE = 60.0
+JOB_MAX_ATTEMPTS = 3
+JOB_IDLE_TIMEOUT = 15 * 60
+JOB_RETENTION = 7 * 24 * 3600
+JOB_UI_REFRESH = 1.0
+JOB_WORKER_LOG = os.path.join(CACHE_DIR, "workers.log")
+
+EXPORT_CHUNK_CHARS = 64 * 1024
+EXPORT_FORMATS = ["txt", "md", "docx", "json"]
+# Streamlit serves <app dir>/static at app/static/ when server.enableStaticServing is on.
+SERVED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "files")
+SERVED_URL = "app/static/files"
+EXPORT_MEMORY_MAX_DOCS = 50
+
+PREPROCESS_MAX_PIXELS = 4_000_000
+PREPROCESS_MAX_DPI = 300
+PREPROCESS_GRAYSCALE = True
+PREPROCESS_JPEG_QUALITY = 85
+PREPROCESS_WORKERS = max(1, os.cpu_count() or 1)
+
+DEDUPE_NEAR_DUPLICATES = False
+DEDUPE_HASH_SIZE = 16
+DEDUPE_EDGE_MARGIN = 4
+DEDUPE_MAX_DISTANCE = 20
+DEDUPE_BLOCK_ROWS = 256
+
+URL_FETCH_WORKERS = 8
+URL_TIMEOUT = 15.0
+URL_SNIFF_BYTES = 1024
+URL_CACHE_MAX_BYTES = 16 * 1024 * 1024
+URL_CACHE_TTL = 30 * 24 * 3600
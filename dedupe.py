@@ -0,0 +1,77 @@
+import numpy as np
+from PIL import Image, ImageOps
+from batch import run_ordered
+from telemetry import span, ocr_deduplicated
+from config import (
+    DEDUPE_NEAR_DUPLICATES, DEDUPE_HASH_SIZE, DEDUPE_EDGE_MARGIN, DEDUPE_MAX_DISTANCE, DEDUPE_BLOCK_ROWS,
+    PREPROCESS_WORKERS
+)
+
+def image_hash(path: str, hash_size: int = DEDUPE_HASH_SIZE) -> np.ndarray | None:
+    # Difference hash: one bit per horizontally adjacent pixel pair of a small grayscale thumbnail.
+    # Rescans, re-encodes and resized copies of the same page land a few bits apart; the margin keeps
+    # blank paper from flipping bits on compression noise.
+    try:
+        with Image.open(path) as image:
+            image.draft("L", (hash_size * 8, hash_size * 8))
+            image = ImageOps.exif_transpose(image).convert("L")
+            thumbnail = image.resize((hash_size + 1, hash_size), Image.Resampling.BOX, reducing_gap=2.0)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1] + DEDUPE_EDGE_MARGIN)
+
+def hamming_distances(hashes: np.ndarray, rows: slice) -> np.ndarray:
+    # Bit differences between a block of rows and every hash; blocks keep the XOR array at rows x n x bytes.
+    return np.bitwise_count(hashes[rows, None, :] ^ hashes[None, :, :]).sum(axis=2, dtype=np.int32)
+
+def near_duplicates(hashes: np.ndarray, max_distance: int = DEDUPE_MAX_DISTANCE) -> list[int | None]:
+    # Each hash is matched to the closest earlier hash that is itself an original, so matches never chain.
+    count = len(hashes)
+    original = np.zeros(count, dtype=bool)
+    matches = [None] * count
+    for start in range(0, count, DEDUPE_BLOCK_ROWS):
+        block = hamming_distances(hashes, slice(start, min(start + DEDUPE_BLOCK_ROWS, count)))
+        for row, distances in enumerate(block):
+            i = start + row
+            candidates = np.flatnonzero(original[:i] & (distances[:i] <= max_distance))
+            if candidates.size:
+                matches[i] = int(candidates[np.argmin(distances[candidates])])
+            else:
+                original[i] = True
+    return matches
+
+def duplicate_plan(items: list[tuple[str, str | None]], near: bool = DEDUPE_NEAR_DUPLICATES,
+                   max_distance: int = DEDUPE_MAX_DISTANCE) -> list[int | None]:
+    # items are (exact key, image path or None). Returns, per item, the index of the earlier item whose
+    # OCR result it can reuse, or None when it has to be OCR'd itself.
+    # Near matching is opt-in: a page that differs by one line hashes as close as a rescan of the same page.
+    with span("dedupe", items=len(items)) as current:
+        plan = [None] * len(items)
+        first = {}
+        for i, (key, _) in enumerate(items):
+            if key in first:
+                plan[i] = first[key]
+            else:
+                first[key] = i
+        exact = sum(p is not None for p in plan)
+
+        candidates = [i for i, (_, path) in enumerate(items) if near and path and plan[i] is None]
+        hashes = run_ordered(candidates, lambda i: image_hash(items[i][1]), PREPROCESS_WORKERS)
+        hashed = [(i, h) for i, h in zip(candidates, hashes) if isinstance(h, np.ndarray)]
+        if len(hashed) > 1:
+            matches = near_duplicates(np.stack([h for _, h in hashed]), max_distance)
+            for (i, _), match in zip(hashed, matches):
+                if match is not None:
+                    plan[i] = hashed[match][0]
+        near_count = sum(p is not None for p in plan) - exact
+
+        current.set_attribute("exact", exact)
+        current.set_attribute("near", near_count)
+        ocr_deduplicated.add(exact, {"match": "exact"})
+        ocr_deduplicated.add(near_count, {"match": "near"})
+        return plan
+
+def fan_out(result: dict, name: str, preview: str) -> dict:
+    # A duplicate gets the original's OCR under its own name and preview.
+    return {**result, "name": name, "preview": preview, "duplicate_of": result["name"]}
@@ -0,0 +1,129 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from artifacts import served_store
+from config import EXPORT_CHUNK_CHARS, EXPORT_FORMATS
+from models import to_json, from_json
+from utils import export_docx
+
+MIME_TYPES = {
+    "txt": "text/plain",
+    "md": "text/markdown",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "json": "application/json",
+    "jsonl": "application/x-ndjson",
+    "zip": "application/zip",
+}
+
+def safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("._") or "document"
+
+def export_record(result: dict) -> dict:
+    # Inline previews are the whole file as base64; exports keep only references and URLs.
+    record = to_json(result)
+    if record.get("preview", "").startswith("data:"):
+        record["preview"] = ""
+    return record
+
+def markdown_parts(result: dict):
+    yield f"# {result['name']}\n\n"
+    if not result.get("pages"):
+        yield result["text"]
+        return
+    for p in result["pages"]:
+        separator = "\n\n" if p.number > 1 else ""
+        yield f"{separator}## Page {p.number}\n\n"
+        yield p.markdown(result["text"])
+
+def text_parts(result: dict, fmt: str):
+    # Text payloads are produced as slices, so a large document is never copied whole into an export buffer.
+    if fmt == "txt":
+        parts = [result["text"]]
+    elif fmt == "md":
+        parts = markdown_parts(result)
+    else:
+        parts = [json.dumps(export_record(result), indent=2)]
+    for part in parts:
+        for start in range(0, len(part), EXPORT_CHUNK_CHARS):
+            yield part[start:start + EXPORT_CHUNK_CHARS].encode()
+
+def docx_bytes(result: dict) -> bytes:
+    buffer = io.BytesIO()
+    export_docx(result["text"], buffer)
+    return buffer.getvalue()
+
+def export_payload(result: dict, fmt: str) -> bytes:
+    # Called by download buttons only when clicked.
+    if fmt == "docx":
+        return docx_bytes(result)
+    return b"".join(text_parts(result, fmt))
+
+def write_member(archive: zipfile.ZipFile, name: str, result: dict, fmt: str) -> None:
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    with archive.open(info, "w", force_zip64=True) as member:
+        if fmt == "docx":
+            member.write(docx_bytes(result))
+        else:
+            for chunk in text_parts(result, fmt):
+                member.write(chunk)
+
+def write_zip(results, fileobj, formats: list[str] = EXPORT_FORMATS) -> int:
+    # Each member is compressed straight into fileobj; only the current document's payload is in memory.
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for count, result in enumerate(results, start=1):
+            base = f"{count:04d}_{safe_name(result['name'])}"
+            for fmt in formats:
+                write_member(archive, f"{fmt}/{base}.{fmt}", result, fmt)
+    return count
+
+def write_jsonl(results, fileobj) -> int:
+    count = 0
+    for count, result in enumerate(results, start=1):
+        fileobj.write(json.dumps(export_record(result)).encode() + b"\n")
+    return count
+
+def write_archive(results, fileobj, archive: str = "zip", formats: list[str] = EXPORT_FORMATS) -> int:
+    if archive == "jsonl":
+        return write_jsonl(results, fileobj)
+    return write_zip(results, fileobj, formats)
+
+def export_file(results, archive: str = "zip", formats: list[str] = EXPORT_FORMATS) -> str:
+    # Written straight into the served export folder; the browser then downloads it from disk.
+    return served_store().put_file(lambda f: write_archive(results, f, archive, formats), "." + archive)
+
+def export_bytes(results, archive: str = "zip", formats: list[str] = EXPORT_FORMATS) -> bytes:
+    # For download buttons, which hold whatever they are given in Streamlit's in-memory media store.
+    with tempfile.TemporaryFile() as out:
+        write_archive(results, out, archive, formats)
+        out.seek(0)
+        return out.read()
+
+def iter_jsonl(path: str):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield from_json(json.loads(line))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export batch OCR results as a ZIP or JSONL archive.")
+    parser.add_argument("results", help="JSONL written by batch_ocr.py")
+    parser.add_argument("--out", required=True, help="output .zip or .jsonl")
+    parser.add_argument("--formats", nargs="+", choices=EXPORT_FORMATS, default=EXPORT_FORMATS,
+                        help="formats included in a ZIP (default: all)")
+    args = parser.parse_args(argv)
+
+    with open(args.out, "wb") as out:
+        count = write_archive(iter_jsonl(args.results), out, "jsonl" if args.out.endswith(".jsonl") else "zip",
+                              args.formats)
+    print(f"exported {count} document(s) to {args.out} ({os.path.getsize(args.out) / 1024:.1f} KB)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from artifacts import artifact_store
+from cache import content_hash
+from dedupe import fan_out
+from preprocess import is_image
+from language_service import detect_pages
+from models import to_json
+from ocr_service import iter_ocr_pages, join_pages, ocr_pages, image_store, claim_images
+from pipeline import path_source, url_source, bind_document, make_result, error_result, source_page_count
+from scheduler import scheduler
+from telemetry import configure as configure_telemetry
+from config import (
+    JOB_DB, JOB_WORKERS, JOB_POLL_INTERVAL, JOB_HEARTBEAT, JOB_LEASE, JOB_MAX_ATTEMPTS, JOB_IDLE_TIMEOUT,
+    JOB_RETENTION, JOB_WORKER_LOG, STREAM_PREVIEW_PAGES
+)
+
+FINISHED = ("done", "failed", "cancelled", "duplicate")
+
+def batch_owner(batch_id: str) -> str:
+    # Artifact owner for files a batch still needs, independent of the browser session that submitted it.
+    return f"batch:{batch_id}"
+
+class JobQueue:
+    # Shared by the app and the worker processes; every process opens its own connection.
+    def __init__(self, path: str = JOB_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            "id TEXT PRIMARY KEY, key_hash TEXT NOT NULL, session TEXT, created REAL NOT NULL, total INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, batch TEXT NOT NULL, position INTEGER NOT NULL, "
+            "key_hash TEXT NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL, source TEXT NOT NULL, "
+            "mime TEXT, preview TEXT, sha256 TEXT, include_images INTEGER NOT NULL, stream INTEGER NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, heartbeat REAL, "
+            "pages INTEGER NOT NULL DEFAULT 0, page_count INTEGER, live TEXT, result TEXT, error TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        for column in ("preprocess TEXT", "duplicate_of INTEGER"):
+            try:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # already added by an earlier start
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            "id TEXT PRIMARY KEY, key_hash TEXT NOT NULL, host TEXT, pid INTEGER, heartbeat REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs(key_hash, status, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs(batch, position)")
+
+    def _transaction(self, fn):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same job.
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def submit(self, key_hash: str, session: str, specs: list[dict], include_images: bool) -> str:
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+
+        def insert():
+            self._db.execute("INSERT INTO batches (id, key_hash, session, created, total) VALUES (?, ?, ?, ?, ?)",
+                             (batch_id, key_hash, session, now, len(specs)))
+            self._db.executemany(
+                "INSERT INTO jobs (batch, position, key_hash, kind, name, source, mime, preview, sha256, "
+                "include_images, stream, preprocess, duplicate_of, status, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(batch_id, i, key_hash, s["kind"], s["name"], s["source"], s.get("mime"), s.get("preview", ""),
+                  s.get("sha256"), int(include_images), int(s.get("stream", False)),
+                  json.dumps(s["preprocess"]) if s.get("preprocess") else None, s.get("duplicate_of"),
+                  "queued" if s.get("duplicate_of") is None else "duplicate", now)
+                 for i, s in enumerate(specs)]
+            )
+
+        self._transaction(insert)
+        self.purge()
+        return batch_id
+
+    def claim(self, key_hash: str, worker: str) -> dict | None:
+        # Running jobs whose heartbeat is older than the lease belonged to a worker that died; they are retried.
+        def take():
+            now = time.time()
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, error = ? "
+                "WHERE key_hash = ? AND status = 'running' AND heartbeat < ? AND attempts >= ?",
+                (now, f"worker lost {JOB_MAX_ATTEMPTS} times", key_hash, now - JOB_LEASE, JOB_MAX_ATTEMPTS)
+            )
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE key_hash = ? AND (status = 'queued' OR (status = 'running' AND heartbeat < ?)) "
+                "ORDER BY id LIMIT 1", (key_hash, now - JOB_LEASE)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, started = ?, attempts = attempts + 1, "
+                "pages = 0, live = NULL WHERE id = ?", (worker, now, now, row["id"])
+            )
+            return dict(self._db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+        return self._transaction(take)
+
+    def heartbeat(self, job_id: int) -> None:
+        with self._lock:
+            self._db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def progress(self, job_id: int, pages: int, page_count: int | None = None, live: str | None = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET pages = ?, page_count = COALESCE(?, page_count), live = COALESCE(?, live), "
+                "heartbeat = ? WHERE id = ? AND status = 'running'",
+                (pages, page_count, live, time.time(), job_id)
+            )
+
+    def finish(self, job_id: int, record: dict, failed: bool = False) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, live = NULL, finished = ? WHERE id = ?",
+                ("failed" if failed else "done", json.dumps(record), record["text"] if failed else None,
+                 time.time(), job_id)
+            )
+
+    def cancel(self, batch_id: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE batch = ? AND status = 'queued'",
+                             (time.time(), batch_id))
+
+    def batch(self, batch_id: str) -> dict | None:
+        with self._lock:
+            batch = self._db.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+            if batch is None:
+                return None
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status", (batch_id,)
+            ).fetchall())
+            last = self._db.execute("SELECT MAX(finished) FROM jobs WHERE batch = ?", (batch_id,)).fetchone()[0]
+        finished = sum(counts.get(s, 0) for s in FINISHED)
+        return {**dict(batch), "counts": counts, "finished": finished, "complete": finished == batch["total"],
+                "last_finished": last}
+
+    def jobs(self, batch_id: str) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, position, name, status, duplicate_of, attempts, pages, page_count, live, error, started, finished "
+                "FROM jobs WHERE batch = ? ORDER BY position", (batch_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def results(self, batch_id: str) -> list[dict]:
+        # Serialized records in submission order; jobs that never produced one get an error record.
+        # Duplicates were never run and take the record of the earlier job they point at.
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, preview, mime, status, duplicate_of, result, error, started, finished "
+                "FROM jobs WHERE batch = ? ORDER BY position", (batch_id,)
+            ).fetchall()
+        records = []
+        for r in rows:
+            if r["duplicate_of"] is not None:
+                record = fan_out(records[r["duplicate_of"]], r["name"], r["preview"])
+            elif r["result"]:
+                record = json.loads(r["result"])
+            else:
+                record = to_json(error_result(r["name"], r["preview"], r["error"] or r["status"], r["mime"]))
+            record["elapsed"] = (r["finished"] - r["started"]) if r["started"] and r["finished"] else None
+            records.append(record)
+        return records
+
+    def batches(self, key_hash: str, limit: int = 10) -> list[dict]:
+        with self._lock:
+            ids = [r["id"] for r in self._db.execute(
+                "SELECT id FROM batches WHERE key_hash = ? ORDER BY created DESC LIMIT ?", (key_hash, limit)
+            )]
+        return [b for b in (self.batch(i) for i in ids) if b is not None]
+
+    def pending(self, key_hash: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE key_hash = ? AND status IN ('queued', 'running')", (key_hash,)
+            ).fetchone()[0]
+
+    def reserve_workers(self, key_hash: str, count: int) -> list[str]:
+        # Live workers are counted here rather than per app process, so restarts, other sessions and workers
+        # started by hand all see the same pool. Missing slots are reserved in the same transaction, so two
+        # sessions starting workers at once cannot both fill the same gap.
+        def reserve():
+            now = time.time()
+            self._db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - JOB_LEASE,))
+            live = self._db.execute("SELECT COUNT(*) FROM workers WHERE key_hash = ?", (key_hash,)).fetchone()[0]
+            slots = [uuid.uuid4().hex for _ in range(count - live)]
+            self._db.executemany("INSERT INTO workers (id, key_hash, heartbeat) VALUES (?, ?, ?)",
+                                 [(slot, key_hash, now) for slot in slots])
+            return slots
+
+        return self._transaction(reserve)
+
+    def worker_heartbeat(self, worker_id: str, key_hash: str) -> int:
+        # Renews a worker's lease (taking over its reserved slot on the first beat) and returns how many live
+        # workers share its key.
+        def beat():
+            now = time.time()
+            self._db.execute(
+                "INSERT INTO workers (id, key_hash, host, pid, heartbeat) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET host = excluded.host, pid = excluded.pid, heartbeat = excluded.heartbeat",
+                (worker_id, key_hash, socket.gethostname(), os.getpid(), now)
+            )
+            return self._live_workers(key_hash, now)
+
+        return self._transaction(beat)
+
+    def live_workers(self, key_hash: str) -> int:
+        with self._lock:
+            return self._live_workers(key_hash, time.time())
+
+    def _live_workers(self, key_hash: str, now: float) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM workers WHERE key_hash = ? AND heartbeat >= ?",
+                                (key_hash, now - JOB_LEASE)).fetchone()[0]
+
+    def release_worker(self, worker_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def purge(self, max_age: float = JOB_RETENTION) -> None:
+        cutoff = time.time() - max_age
+        with self._lock:
+            old = [r["id"] for r in self._db.execute("SELECT id FROM batches WHERE created < ?", (cutoff,))]
+            for batch_id in old:
+                self._db.execute("DELETE FROM jobs WHERE batch = ?", (batch_id,))
+                self._db.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+        for batch_id in old:
+            artifact_store.release_session(batch_owner(batch_id))
+            image_store.release_session(batch_owner(batch_id))
+
+def spec_fingerprint(spec: dict) -> tuple[str, str | None]:
+    # Exact key for duplicate_plan, plus the file to hash perceptually for uploaded images.
+    if spec["kind"] == "url":
+        return spec.get("digest") or spec["source"], None
+    source = path_source(spec["name"], spec["source"], spec["mime"], sha256=spec.get("sha256"),
+                         preprocess=spec.get("preprocess"))
+    return source["digest"], spec["source"] if is_image(spec["mime"]) else None
+
+def job_source(job: dict) -> dict:
+    if job["kind"] == "url":
+        return url_source(job["source"])
+    preprocess = json.loads(job["preprocess"]) if job["preprocess"] else None
+    return path_source(job["name"], job["source"], job["mime"], preview=job["preview"], sha256=job["sha256"],
+                       preprocess=preprocess, inline=True)
+
+def run_job(api_key: str, queue: JobQueue, job: dict) -> dict:
+    source = job_source(job)
+    document = bind_document(api_key, source)
+    include_images = bool(job["include_images"])
+    if job["stream"]:
+        page_count = source_page_count(source) if job["kind"] == "path" else None
+        pages = []
+        for number, markdown in iter_ocr_pages(api_key, document, source["digest"], page_count=page_count,
+                                               include_images=include_images):
+            pages.append(markdown)
+            live = "\n\n".join(pages) if number <= STREAM_PREVIEW_PAGES else None
+            queue.progress(job["id"], number, page_count, live)
+    else:
+        pages = ocr_pages(api_key, document, source["digest"], include_images)
+        queue.progress(job["id"], len(pages), len(pages))
+    text, offsets = join_pages(pages)
+    # Already in a worker process, so language detection runs inline rather than in another pool.
+    return make_result(source, text, offsets, detect_pages(pages), include_images)
+
+def worker_main(api_key: str, key_hash: str, worker_id: str | None = None) -> None:
+    configure_telemetry()
+    queue = JobQueue()
+    worker_id = worker_id or uuid.uuid4().hex
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    current = {"id": None}
+    stop = threading.Event()
+    # The API rate limit is split between every live worker for this key, re-counted on each heartbeat,
+    # plus one share the app keeps for summaries and Q&A (see share_with_workers).
+    scheduler.share(queue.worker_heartbeat(worker_id, key_hash) + 1)
+
+    def beat():
+        while not stop.wait(JOB_HEARTBEAT):
+            scheduler.share(queue.worker_heartbeat(worker_id, key_hash) + 1)
+            if current["id"] is not None:
+                queue.heartbeat(current["id"])
+
+    threading.Thread(target=beat, daemon=True).start()
+    idle_since = time.monotonic()
+    try:
+        while time.monotonic() - idle_since < JOB_IDLE_TIMEOUT:
+            job = queue.claim(key_hash, name)
+            if job is None:
+                time.sleep(JOB_POLL_INTERVAL)
+                continue
+            current["id"] = job["id"]
+            owner = batch_owner(job["batch"])
+            artifact_store.touch_session(owner)
+            image_store.touch_session(owner)
+            try:
+                result = run_job(api_key, queue, job)
+                claim_images(result["images"], owner)
+                queue.finish(job["id"], to_json(result))
+            except Exception as e:
+                queue.finish(job["id"], to_json(error_result(job["name"], job["preview"], e, job["mime"])),
+                             failed=True)
+            current["id"] = None
+            idle_since = time.monotonic()
+    finally:
+        stop.set()
+        queue.release_worker(worker_id)
+
+def share_with_workers(key_hash: str) -> None:
+    # The app process calls the API too, so it takes one share alongside the live workers for the key.
+    scheduler.share(job_queue.live_workers(key_hash) + 1)
+
+def ensure_workers(api_key: str, count: int = JOB_WORKERS) -> int:
+    # Starts workers until `count` are live for this key and returns how many were started.
+    # Plain subprocesses rather than multiprocessing: Streamlit runs the app as __main__, which spawn would re-execute.
+    # The key goes over stdin, so it never reaches disk or the process list. Output goes to a log file, since
+    # workers outlive the app and must never block on a pipe nobody reads.
+    slots = job_queue.reserve_workers(content_hash(api_key), count)
+    if not slots:
+        return 0
+    # A key exported where the app runs must never stand in for the one the user entered.
+    env = {k: v for k, v in os.environ.items() if k != "MISTRAL_API_KEY"}
+    with open(JOB_WORKER_LOG, "a") as log:
+        for slot in slots:
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--slot", slot], env=env,
+                                       stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True)
+            process.stdin.write(api_key + "\n")
+            process.stdin.close()
+    return len(slots)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run an OCR job worker against the local job queue. Every live worker for the same key, "
+                    "including those the app starts, shares the API rate limit."
+    )
+    parser.add_argument("--slot", help=argparse.SUPPRESS)  # worker slot reserved by ensure_workers
+    args = parser.parse_args(argv)
+    # Workers started by the app hold a slot reserved for the key they are sent, so they only read stdin.
+    api_key = None if args.slot else os.environ.get("MISTRAL_API_KEY")
+    api_key = api_key or sys.stdin.readline().strip()
+    if not api_key:
+        parser.error("set MISTRAL_API_KEY or pass the key on stdin")
+    worker_main(api_key, content_hash(api_key), args.slot)
+
+job_queue = JobQueue()
+
+if __name__ == "__main__":
+    main()
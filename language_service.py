@@ -0,0 +1,62 @@
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from langdetect import DetectorFactory, detect
+from langdetect.lang_detect_exception import LangDetectException
+from config import LANG_SAMPLE_CHARS, LANG_WORKERS
+from telemetry import span
+
+# langdetect draws random n-grams; a fixed seed makes the same text always get the same label.
+DetectorFactory.seed = 0
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def sample_text(text: str, max_chars: int = LANG_SAMPLE_CHARS) -> str:
+    # Beginning, middle and end of the page, so a long page costs the same as a short one.
+    if len(text) <= max_chars:
+        return text
+    third = max_chars // 3
+    middle = (len(text) - third) // 2
+    return " ".join((text[:third], text[middle:middle + third], text[-third:]))
+
+def detect_pages(pages: list[str], max_chars: int = LANG_SAMPLE_CHARS) -> dict:
+    labels, weights = [], Counter()
+    for page in pages:
+        sample = sample_text(page, max_chars)
+        try:
+            lang = detect(sample)
+        except LangDetectException:
+            lang = "unknown"
+        labels.append(lang)
+        if lang != "unknown":
+            weights[lang] += len(sample)
+    total = sum(weights.values())
+    distribution = {lang: round(w / total, 3) for lang, w in weights.most_common()} if total else {}
+    return {
+        "language": next(iter(distribution), "unknown"),
+        "pages": labels,
+        "distribution": distribution
+    }
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=LANG_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def detect_document(pages: list[str]) -> dict:
+    # Blocks only the calling thread; the CPU-bound work happens in another process.
+    global _pool
+    with span("detect_language", pages=len(pages)) as current:
+        try:
+            result = _get_pool().submit(detect_pages, pages).result()
+        except BrokenProcessPool:
+            with _pool_lock:
+                _pool = None
+            result = detect_pages(pages)
+        current.set_attribute("language", result["language"])
+        return result
@@ -1,24 +1,155 @@
-from mistralai import Mistral
-from config import MODEL_LLM
-
-def summarize_text(api_key: str, text: str) -> str:
-    client = Mistral(api_key=api_key)
-    res = client.chat.complete(
-        model=MODEL_LLM,
-        messages=[
+import os
+import time
+from batch import run_ordered
+from cache import DiskCache, content_hash
+from clients import get_client
+from metrics import metrics
+from scheduler import scheduler
+from telemetry import span, traced_stream, record_usage
+from config import (
+    MODEL_LLM, CACHE_DIR, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL,
+    RETRIEVAL_CHUNK_CHARS, RETRIEVAL_TOP_K, SUMMARY_CHUNK_CHARS, SUMMARY_MAX_WORKERS
+)
+from retrieval import chunk_text, get_index
+
+llm_cache = DiskCache(os.path.join(CACHE_DIR, "llm.sqlite3"), LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL)
+
+def _stream_chat(api_key: str, messages: list[dict], operation: str):
+    for event in scheduler.stream(get_client(api_key).chat.stream, model=MODEL_LLM, messages=messages):
+        record_usage(event.data.usage, operation)
+        delta = event.data.choices[0].delta.content
+        if delta:
+            yield delta
+
+def _record_stream(deltas, metric: str, cache_key: str):
+    # Time to first token is measured from the request, including any map step, as the user sees it.
+    start = time.perf_counter()
+    parts = []
+    for delta in deltas:
+        if not parts:
+            metrics.record(metric, time.perf_counter() - start)
+        parts.append(delta)
+        yield delta
+    metrics.record(metric.replace(".ttft.", ".total."), time.perf_counter() - start)
+    llm_cache.set(cache_key, "".join(parts))
+
+def summary_chunks(text: str, pages: list[str] | None = None, max_chars: int = SUMMARY_CHUNK_CHARS) -> list[str]:
+    # Consecutive pages are packed up to max_chars; only pages larger than that are cut further.
+    pieces = []
+    for page in pages or [text]:
+        pieces.extend([page] if len(page) <= max_chars else chunk_text(page, max_chars))
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks or [text]
+
+def summarize_chunk(api_key: str, chunk: str) -> str:
+    key = content_hash("partial-summary", MODEL_LLM, chunk)
+    summary = llm_cache.get(key)
+    if summary is None:
+        res = scheduler.call(
+            get_client(api_key).chat.complete,
+            model=MODEL_LLM,
+            messages=[
+                {"role": "system", "content": "Summarize this part of a longer document. Keep names, figures and dates."},
+                {"role": "user", "content": chunk}
+            ]
+        )
+        record_usage(res.usage, "summarize_chunk")
+        summary = res.choices[0].message.content
+        llm_cache.set(key, summary)
+    return summary
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+def summary_key(text: str) -> str:
+    return content_hash("summary", MODEL_LLM, text)
+
+def cached_summary(text: str) -> str | None:
+    # Checked on every rerun of a result panel, so it peeks rather than counting as a cache lookup.
+    return llm_cache.peek(summary_key(text))
+
+def summarize_text_stream(api_key: str, text: str, pages: list[str] | None = None,
+                          max_workers: int = SUMMARY_MAX_WORKERS):
+    key = summary_key(text)
+    summary = llm_cache.get(key)
+    if summary is not None:
+        deltas = iter([summary])
+    else:
+        deltas = _record_stream(_summary_deltas(api_key, text, pages, max_workers), "llm.ttft.summary", key)
+    yield from traced_stream("summarize_text", deltas, cache_hit=summary is not None, chars=len(text))
+
+def _summary_deltas(api_key: str, text: str, pages: list[str] | None, max_workers: int):
+    chunks = summary_chunks(text, pages)
+    if len(chunks) == 1:
+        yield from _stream_chat(api_key, [
             {"role": "system", "content": "Summarize the document"},
-            {"role": "user", "content": text}
-        ]
-    )
-    return res.choices[0].message.content
-
-def qa_text(api_key: str, text: str, question: str) -> str:
-    client = Mistral(api_key=api_key)
-    res = client.chat.complete(
-        model=MODEL_LLM,
-        messages=[
-            {"role": "system", "content": "Answer the question based on the provided text"},
-            {"role": "user", "content": f"Text:\n{text}\n\nQuestion:\n{question}"}
-        ]
-    )
-    return res.choices[0].message.content
+            {"role": "user", "content": chunks[0]}
+        ], "summarize_text")
+        return
+
+    partials = run_ordered(chunks, lambda chunk: summarize_chunk(api_key, chunk), max_workers)
+    for partial in partials:
+        if isinstance(partial, Exception):
+            raise partial
+    yield from _stream_chat(api_key, [
+        {"role": "system", "content": "Merge these summaries of consecutive parts of one document into a single summary"},
+        {"role": "user", "content": "\n\n".join(f"Part {i}:\n{p}" for i, p in enumerate(partials, start=1))}
+    ], "summarize_text")
+
+def summarize_text(api_key: str, text: str, pages: list[str] | None = None) -> str:
+    return "".join(summarize_text_stream(api_key, text, pages))
+
+def qa_context(text: str, question: str, chunk_size: int = RETRIEVAL_CHUNK_CHARS, k: int = RETRIEVAL_TOP_K) -> str:
+    # Short documents fit in the prompt as they are; longer ones send only the best-matching passages.
+    if len(text) <= chunk_size * k:
+        return text
+    return get_index(text, chunk_size).context(question, k)
+
+def _qa_key(text: str, question: str, chunk_size: int, k: int) -> str:
+    return content_hash("qa", MODEL_LLM, text, normalize_question(question), str(chunk_size), str(k))
+
+def _qa_messages(text: str, question: str, chunk_size: int, k: int) -> list[dict]:
+    context = qa_context(text, question, chunk_size, k)
+    return [
+        {"role": "system", "content": "Answer the question based on the provided text"},
+        {"role": "user", "content": f"Text:\n{context}\n\nQuestion:\n{question}"}
+    ]
+
+def qa_text(api_key: str, text: str, question: str,
+            chunk_size: int = RETRIEVAL_CHUNK_CHARS, k: int = RETRIEVAL_TOP_K) -> str:
+    with span("qa_text", chars=len(text)) as current:
+        key = _qa_key(text, question, chunk_size, k)
+        answer = llm_cache.get(key)
+        current.set_attribute("cache_hit", answer is not None)
+        if answer is not None:
+            return answer
+
+        client = get_client(api_key)
+        res = scheduler.call(
+            client.chat.complete,
+            model=MODEL_LLM,
+            messages=_qa_messages(text, question, chunk_size, k)
+        )
+        record_usage(res.usage, "qa_text")
+        answer = res.choices[0].message.content
+        llm_cache.set(key, answer)
+        return answer
+
+def qa_text_stream(api_key: str, text: str, question: str,
+                   chunk_size: int = RETRIEVAL_CHUNK_CHARS, k: int = RETRIEVAL_TOP_K):
+    key = _qa_key(text, question, chunk_size, k)
+    answer = llm_cache.get(key)
+    if answer is not None:
+        deltas = iter([answer])
+    else:
+        deltas = _record_stream(_stream_chat(api_key, _qa_messages(text, question, chunk_size, k), "qa_text"),
+                                "llm.ttft.qa", key)
+    yield from traced_stream("qa_text", deltas, cache_hit=answer is not None, chars=len(text))
@@ -0,0 +1,27 @@
+import threading
+from collections import defaultdict, deque
+
+class Metrics:
+    # In-process samples per metric name; a bounded window keeps percentiles cheap.
+    def __init__(self, window: int = 1000):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, name: str, value: float) -> None:
+        with self._lock:
+            self._samples[name].append(value)
+
+    def summary(self, name: str) -> dict | None:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+        return {
+            "count": len(samples),
+            "mean": sum(samples) / len(samples),
+            "p50": pick(0.50),
+            "p95": pick(0.95),
+        }
+
+metrics = Metrics()
@@ -0,0 +1,44 @@
+class PageRecord:
+    # Offsets into the result text rather than a second copy of each page's markdown.
+    __slots__ = ("number", "start", "end", "words", "language")
+
+    def __init__(self, number: int, start: int, end: int, words: int, language: str = "unknown"):
+        self.number = number
+        self.start = start
+        self.end = end
+        self.words = words
+        self.language = language
+
+    @property
+    def chars(self) -> int:
+        return self.end - self.start
+
+    def markdown(self, text: str) -> str:
+        return text[self.start:self.end]
+
+    def to_dict(self) -> dict:
+        return {"number": self.number, "chars": self.chars, "words": self.words, "language": self.language}
+
+def build_pages(text: str, offsets: list[int] | None, languages: list[str] | None = None) -> list[PageRecord]:
+    if not offsets:
+        return []
+    ends = [start - 2 for start in offsets[1:]] + [len(text)]
+    languages = languages or []
+    return [
+        PageRecord(
+            number,
+            start,
+            end,
+            len(text[start:end].split()),
+            languages[number - 1] if number <= len(languages) else "unknown"
+        )
+        for number, (start, end) in enumerate(zip(offsets, ends), start=1)
+    ]
+
+def to_json(result: dict) -> dict:
+    return {**result, "pages": [p.to_dict() for p in result.get("pages") or []]}
+
+def from_json(record: dict) -> dict:
+    # Page records are rebuilt from the text and offsets rather than trusted from the serialized form.
+    languages = (record.get("languages") or {}).get("pages")
+    return {**record, "pages": build_pages(record["text"], record.get("page_offsets"), languages)}
@@ -1,12 +1,213 @@
-from mistralai import Mistral
-from config import MODEL_OCR
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from artifacts import ArtifactStore
+from clients import get_client
+from scheduler import scheduler
+from cache import DiskCache, content_hash
+from remote import resolve_url
+from telemetry import span, traced_stream, upload_bytes, ocr_page_count
+from config import MODEL_OCR, CACHE_DIR, OCR_CACHE_MAX_BYTES, OCR_CACHE_TTL, OCR_MAX_WORKERS, OCR_PAGE_CHUNK
 
-def run_ocr(api_key: str, document: dict) -> str:
-    client = Mistral(api_key=api_key)
-    response = client.ocr.process(
+ocr_cache = DiskCache(os.path.join(CACHE_DIR, "ocr.sqlite3"), OCR_CACHE_MAX_BYTES, OCR_CACHE_TTL)
+image_store = ArtifactStore(os.path.join(CACHE_DIR, "images"))
+
+def ocr_options(include_images: bool = False) -> dict:
+    return {"include_image_base64": include_images}
+
+def document_digest(document: dict) -> str:
+    source = document[document["type"]]
+    # Inline data URLs already carry the file bytes; remote files are keyed by redirect target plus version.
+    if source.startswith("data:"):
+        return content_hash(source)
+    return resolve_url(source)["digest"]
+
+def ocr_cache_key(document, digest: str | None = None, include_images: bool = False) -> str:
+    options = json.dumps(ocr_options(include_images), sort_keys=True)
+    return content_hash(MODEL_OCR, options, digest or document_digest(document))
+
+def _store_images(pages, manifest: dict) -> None:
+    # Each image is written to disk and dropped from the response before the next one is decoded.
+    for p in pages:
+        refs = []
+        for image in getattr(p, "images", None) or []:
+            if image.image_base64:
+                refs.append({"id": image.id, "ref": image_store.put_base64(image.image_base64)})
+                image.image_base64 = None
+        if refs:
+            manifest[str(p.index + 1)] = refs
+
+def _cached_pages(key: str, include_images: bool):
+    pages = ocr_cache.get(key)
+    if pages is not None and include_images:
+        # Images removed by cleanup can only be fetched again with the OCR call that returned them.
+        # The manifest rides along with the pages lookup: not counted again, but kept as recent as the pages.
+        manifest = ocr_cache.peek(key + ":images", touch=True)
+        if manifest is None or not all(image_store.exists(i["ref"]) for refs in manifest.values() for i in refs):
+            return None
+    return pages
+
+def _upload(client, path: str, file_name: str, mime: str):
+    # Opened per attempt so a retried upload starts from the first byte again.
+    with open(path, "rb") as f:
+        return client.files.upload(
+            file={"file_name": file_name, "content": f, "content_type": mime},
+            purpose="ocr"
+        )
+
+def upload_document(api_key: str, path: str, file_name: str, mime: str) -> dict:
+    # The file is streamed from disk as multipart, so it is never base64-encoded in memory.
+    size = os.path.getsize(path)
+    with span("upload_document", bytes=size, mime=mime):
+        uploaded = scheduler.call(_upload, get_client(api_key), path, file_name, mime)
+    upload_bytes.add(size, {"mode": "file"})
+    return {"type": "file", "file_id": uploaded.id}
+
+def delete_upload(api_key: str, document: dict) -> None:
+    if document.get("type") != "file":
+        return
+    try:
+        get_client(api_key).files.delete(file_id=document["file_id"])
+    except Exception:
+        pass
+
+def resolve_document(document):
+    # Documents may be given lazily so uploads only happen on a cache miss.
+    return document() if callable(document) else document
+
+def ocr_pages(api_key: str, document, digest: str | None = None, include_images: bool = False) -> list[str]:
+    with span("run_ocr", include_images=include_images) as current:
+        key = ocr_cache_key(document, digest, include_images)
+        pages = _cached_pages(key, include_images)
+        current.set_attribute("cache_hit", pages is not None)
+        if pages is None:
+            pages = _ocr_document(api_key, document, key, include_images)
+        current.set_attribute("pages", len(pages))
+        return pages
+
+def _ocr_document(api_key: str, document, key: str, include_images: bool) -> list[str]:
+    client = get_client(api_key)
+    resolved = resolve_document(document)
+    try:
+        response = scheduler.call(
+            client.ocr.process,
+            model=MODEL_OCR,
+            document=resolved,
+            **ocr_options(include_images)
+        )
+    finally:
+        if resolved is not document:
+            delete_upload(api_key, resolved)
+    response_pages = getattr(response, "pages", [])
+    ocr_page_count.add(len(response_pages))
+    if include_images:
+        manifest = {}
+        _store_images(response_pages, manifest)
+        ocr_cache.set(key + ":images", manifest)
+    pages = [p.markdown for p in response_pages]
+    ocr_cache.set(key, pages)
+    return pages
+
+def join_pages(pages: list[str]) -> tuple[str, list[int]]:
+    # Offsets mark where each page starts in the joined text, so page boundaries survive flattening.
+    offsets, position = [], 0
+    for markdown in pages:
+        offsets.append(position)
+        position += len(markdown) + 2
+    return "\n\n".join(pages) or "No text detected", offsets
+
+def split_pages(text: str, offsets: list[int] | None) -> list[str]:
+    if not offsets:
+        return [text]
+    ends = offsets[1:] + [len(text) + 2]
+    return [text[start:end - 2] for start, end in zip(offsets, ends)]
+
+def run_ocr(api_key: str, document, digest: str | None = None, include_images: bool = False) -> str:
+    return join_pages(ocr_pages(api_key, document, digest, include_images))[0]
+
+def claim_images(cache_key: str | None, owner: str) -> None:
+    # Page images are kept while a session or batch holding the result still refers to them.
+    manifest = ocr_cache.peek(cache_key + ":images") if cache_key else None
+    for refs in (manifest or {}).values():
+        for image in refs:
+            image_store.claim(image["ref"], owner)
+
+def page_images(cache_key: str, page_number: int) -> list[tuple[str, str]]:
+    manifest = ocr_cache.peek(cache_key + ":images") or {}
+    return [
+        (image["id"], image_store.path(image["ref"]))
+        for image in manifest.get(str(page_number), [])
+        if image_store.exists(image["ref"])
+    ]
+
+def _ocr_range(api_key: str, document: dict, pages: list[int], manifest: dict | None) -> dict[int, str]:
+    response = scheduler.call(
+        get_client(api_key).ocr.process,
         model=MODEL_OCR,
         document=document,
-        include_image_base64=True
+        pages=pages,
+        **ocr_options(manifest is not None)
     )
-    pages = getattr(response, "pages", [])
-    return "\n\n".join(p.markdown for p in pages) or "No text detected"
\ No newline at end of file
+    response_pages = getattr(response, "pages", [])
+    ocr_page_count.add(len(response_pages))
+    if manifest is not None:
+        _store_images(response_pages, manifest)
+    return {p.index: p.markdown for p in response_pages}
+
+def iter_ocr_pages(api_key: str, document, digest: str | None = None, page_count: int | None = None,
+                   chunk_size: int = OCR_PAGE_CHUNK, max_workers: int = OCR_MAX_WORKERS, include_images: bool = False):
+    # Yields (page_number, markdown) in page order while later ranges are still in flight.
+    # Ranges need a known page count: an error past the last page reads like any other API error, so
+    # without a count the document is OCR'd in one call and its pages are yielded once it returns.
+    key = ocr_cache_key(document, digest, include_images)
+    cached = _cached_pages(key, include_images)
+    if cached is not None:
+        pages = enumerate(cached, start=1)
+    elif page_count is None:
+        pages = _whole_document(api_key, document, key, include_images)
+    else:
+        pages = _stream_ranges(api_key, document, key, page_count, chunk_size, max_workers, include_images)
+    yield from traced_stream("run_ocr", pages, cache_hit=cached is not None, streamed=page_count is not None,
+                             include_images=include_images)
+
+def _whole_document(api_key: str, document, key: str, include_images: bool):
+    yield from enumerate(_ocr_document(api_key, document, key, include_images), start=1)
+
+def _stream_ranges(api_key: str, document, key: str, page_count: int,
+                   chunk_size: int, max_workers: int, include_images: bool):
+    received = {}
+    manifest = {} if include_images else None
+    pending = {}
+    next_start = 0
+    next_page = 0
+    lazy = document
+    document = resolve_document(document)
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        while True:
+            while len(pending) < max_workers and next_start < page_count:
+                end = min(next_start + chunk_size, page_count)
+                future = pool.submit(_ocr_range, api_key, document, list(range(next_start, end)), manifest)
+                pending[future] = next_start
+                next_start = end
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                received.update(future.result())
+
+            while next_page in received:
+                next_page += 1
+                yield next_page, received[next_page - 1]
+    finally:
+        pool.shutdown(wait=lazy is not document, cancel_futures=True)
+        if lazy is not document:
+            delete_upload(api_key, document)
+
+    if len(received) != next_page or next_page != page_count:
+        raise RuntimeError(f"OCR returned pages out of sequence after page {next_page}")
+    if manifest is not None:
+        ocr_cache.set(key + ":images", manifest)
+    ocr_cache.set(key, [received[i] for i in sorted(received)])
@@ -0,0 +1,113 @@
+import hashlib
+import mmap
+import os
+from functools import partial
+from cache import content_hash
+from ocr_service import ocr_pages, join_pages, ocr_cache_key, upload_document
+from language_service import detect_document
+from models import build_pages
+from preprocess import is_image, options_key, preprocess_path
+from remote import resolve_url, document_kind
+from utils import encode_file, pdf_page_count
+
+def file_source(name: str, file_bytes: bytes, mime: str, preview: str | None = None) -> dict:
+    data_url = encode_file(file_bytes, mime)
+    kind = "document_url" if "pdf" in mime else "image_url"
+    return {
+        "name": name,
+        "preview": preview or data_url,
+        "mime": mime,
+        "document": {"type": kind, kind: data_url},
+        "digest": content_hash(mime, file_bytes)
+    }
+
+def file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def upload_preprocessed(api_key: str, path: str, file_name: str, mime: str, options: dict, inline: bool = False) -> dict:
+    processed_path, processed_mime, _, _ = preprocess_path(path, options, inline)
+    try:
+        if processed_mime != mime:
+            file_name = os.path.splitext(file_name)[0] + ".jpg"
+        return upload_document(api_key, processed_path, file_name, processed_mime)
+    finally:
+        os.remove(processed_path)
+
+def path_source(name: str, path: str, mime: str, preview: str | None = None, sha256: str | None = None,
+                preprocess: dict | None = None, inline: bool = False) -> dict:
+    # The document is uploaded from disk only if OCR is actually needed; the digest comes from a streamed hash.
+    # Preprocessing settings are part of the digest, so each setting has its own cache entry.
+    digest_parts = [mime, sha256 or file_sha256(path)]
+    if preprocess and is_image(mime):
+        document = partial(upload_preprocessed, path=path, file_name=name, mime=mime, options=preprocess, inline=inline)
+        digest_parts.append(options_key(preprocess))
+    else:
+        document = partial(upload_document, path=path, file_name=name, mime=mime)
+    return {
+        "name": name,
+        "preview": preview or path,
+        "path": path,
+        "mime": mime,
+        "document": document,
+        "digest": content_hash(*digest_parts)
+    }
+
+def source_page_count(source: dict) -> int | None:
+    if "pdf" not in source.get("mime", "") or not os.path.getsize(source["path"]):
+        return None
+    with open(source["path"], "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return pdf_page_count(mapped)
+
+def url_source(url: str, resolved: dict | None = None) -> dict:
+    # The type comes from the file itself; the digest follows redirects and the server's validators (or the
+    # body's hash when it sends none), so an unchanged file keeps its cached OCR and a changed one never does.
+    resolved = resolved or resolve_url(url)
+    kind = document_kind(resolved["mime"])
+    return {
+        "name": resolved["name"],
+        "preview": resolved["url"],
+        "mime": resolved["mime"],
+        "document": {"type": kind, kind: resolved["url"]},
+        "digest": resolved["digest"]
+    }
+
+def make_result(source: dict, text: str, offsets: list[int] | None, languages: dict, include_images: bool = False) -> dict:
+    return {
+        "name": source["name"],
+        "preview": source["preview"],
+        "mime": source.get("mime"),
+        "text": text,
+        "language": languages["language"],
+        "languages": {"pages": languages["pages"], "distribution": languages["distribution"]},
+        "page_offsets": offsets,
+        "pages": build_pages(text, offsets, languages["pages"]),
+        "images": ocr_cache_key(source["document"], source["digest"], True) if include_images else None
+    }
+
+def error_result(name: str, preview: str, error: Exception, mime: str | None = None) -> dict:
+    return {
+        "name": name,
+        "preview": preview,
+        "mime": mime,
+        "text": f"Error: {error}",
+        "language": "unknown",
+        "languages": None,
+        "page_offsets": None,
+        "pages": [],
+        "images": None
+    }
+
+def bind_document(api_key: str, source: dict):
+    document = source["document"]
+    return partial(document, api_key) if callable(document) else document
+
+def ocr_source(api_key: str, source: dict, include_images: bool = False) -> dict:
+    try:
+        document = bind_document(api_key, source)
+        pages = ocr_pages(api_key, document, source["digest"], include_images)
+        text, offsets = join_pages(pages)
+        languages = detect_document(pages)
+    except Exception as e:
+        return error_result(source["name"], source["preview"], e, source.get("mime"))
+    return make_result(source, text, offsets, languages, include_images)
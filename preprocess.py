@@ -0,0 +1,93 @@
+import io
+import json
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps
+from config import (
+    CACHE_DIR, PREPROCESS_MAX_PIXELS, PREPROCESS_MAX_DPI, PREPROCESS_GRAYSCALE, PREPROCESS_JPEG_QUALITY,
+    PREPROCESS_WORKERS
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def preprocess_options(max_pixels: int = PREPROCESS_MAX_PIXELS, max_dpi: int = PREPROCESS_MAX_DPI,
+                       grayscale: bool = PREPROCESS_GRAYSCALE, quality: int = PREPROCESS_JPEG_QUALITY) -> dict:
+    return {"max_pixels": max_pixels, "max_dpi": max_dpi, "grayscale": grayscale, "quality": quality}
+
+def options_key(options: dict) -> str:
+    return json.dumps(options, sort_keys=True)
+
+def is_image(mime: str) -> bool:
+    return mime.startswith("image/")
+
+def target_scale(image: Image.Image, options: dict) -> float:
+    # The stricter of the pixel budget and the DPI cap; images are never enlarged.
+    scale = min(1.0, math.sqrt(options["max_pixels"] / (image.width * image.height)))
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and options["max_dpi"]:
+        scale = min(scale, options["max_dpi"] / float(dpi[0]))
+    return scale
+
+def preprocess_image(data: bytes, options: dict) -> tuple[bytes, str]:
+    # Returns (bytes, mime); the original is kept when the re-encoded image would not be smaller.
+    with Image.open(io.BytesIO(data)) as original:
+        mime = Image.MIME.get(original.format, "application/octet-stream")
+        dpi = original.info.get("dpi")
+        orientation = original.getexif().get(0x0112, 1)
+        width, height = original.size
+        scale = target_scale(original, options)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if scale < 1.0:
+            # JPEG can be decoded at 1/2 to 1/8 scale directly, far cheaper than resampling the full image.
+            original.draft("L" if options["grayscale"] else "RGB", size)
+        image = ImageOps.exif_transpose(original)
+        if scale < 1.0:
+            image = image.resize(size[::-1] if orientation in (5, 6, 7, 8) else size, Image.Resampling.LANCZOS)
+        if image.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha; transparent areas become white paper rather than black.
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        image = image.convert("L" if options["grayscale"] else "RGB")
+        out = io.BytesIO()
+        save_dpi = (round(dpi[0] * min(1.0, scale)),) * 2 if dpi and dpi[0] else None
+        image.save(out, "JPEG", quality=options["quality"], optimize=True, **({"dpi": save_dpi} if save_dpi else {}))
+    if out.tell() >= len(data) and scale >= 1.0 and orientation == 1:
+        return data, mime
+    return out.getvalue(), "image/jpeg"
+
+def preprocess_file(path: str, options: dict) -> tuple[str, str, int, int]:
+    # Writes the result next to the cache so it can be streamed to the files endpoint; the caller deletes it.
+    with open(path, "rb") as f:
+        data = f.read()
+    processed, mime = preprocess_image(data, options)
+    fd, out_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".jpg" if mime == "image/jpeg" else "")
+    with os.fdopen(fd, "wb") as f:
+        f.write(processed)
+    return out_path, mime, len(data), len(processed)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def preprocess_path(path: str, options: dict, inline: bool = False) -> tuple[str, str, int, int]:
+    # Decoding and resampling are CPU-bound, so threads hand them to a process pool; job workers run them inline.
+    global _pool
+    if inline:
+        return preprocess_file(path, options)
+    try:
+        return _get_pool().submit(preprocess_file, path, options).result()
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None
+        return preprocess_file(path, options)
@@ -0,0 +1,142 @@
+import hashlib
+import mimetypes
+import os
+import threading
+import uuid
+from email.message import Message
+from urllib.parse import urlsplit, unquote
+import httpx
+from batch import run_ordered
+from cache import DiskCache, content_hash
+from telemetry import span
+from config import CACHE_DIR, URL_FETCH_WORKERS, URL_TIMEOUT, URL_SNIFF_BYTES, URL_CACHE_MAX_BYTES, URL_CACHE_TTL
+
+url_cache = DiskCache(os.path.join(CACHE_DIR, "urls.sqlite3"), URL_CACHE_MAX_BYTES, URL_CACHE_TTL)
+
+MAGIC = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+def http_client() -> httpx.Client:
+    # One pooled client for all URL lookups, so concurrent requests to the same host reuse connections.
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=URL_FETCH_WORKERS, max_keepalive_connections=URL_FETCH_WORKERS),
+                timeout=httpx.Timeout(URL_TIMEOUT, connect=10.0),
+            )
+        return _client
+
+def sniff_mime(head: bytes, content_type: str | None) -> str:
+    # File signatures win over the Content-Type header, which is often octet-stream or plain wrong.
+    for magic, mime in MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if b"%PDF-" in head:
+        return "application/pdf"  # PDF readers accept a header anywhere in the first kilobyte
+    return (content_type or "application/octet-stream").split(";")[0].strip().lower()
+
+def document_kind(mime: str) -> str:
+    return "image_url" if mime.startswith("image/") else "document_url"
+
+def url_name(url: str) -> str:
+    parts = urlsplit(url)
+    return unquote(parts.path.rstrip("/").rsplit("/", 1)[-1]) or parts.netloc or url
+
+def file_name(response: httpx.Response) -> str:
+    disposition = response.headers.get("Content-Disposition")
+    if disposition:
+        message = Message()
+        message["Content-Disposition"] = disposition
+        name = message.get_filename()
+        if name:
+            return os.path.basename(name)
+    return url_name(str(response.url))
+
+def version(record: dict) -> str:
+    # Without validators the body hash stands in, so a changed file never matches an old version.
+    return record.get("etag") or record.get("last_modified") or record.get("sha256") or ""
+
+def body_sha256(head: bytes, chunks) -> str:
+    digest = hashlib.sha256(head)
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def _fetch(url: str, cached: dict | None) -> dict:
+    # A ranged GET reads only the first bytes for sniffing; validators from the last visit make it conditional.
+    headers = {"Range": f"bytes=0-{URL_SNIFF_BYTES - 1}"}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    with http_client().stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and cached:
+            return {**cached, "revalidated": True}
+        response.raise_for_status()
+        head = b""
+        chunks = response.iter_bytes()
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= URL_SNIFF_BYTES:
+                break  # servers that ignore Range send the whole file; the rest is only read to hash it
+        record = {
+            "url": url,
+            "final_url": str(response.url),
+            "name": file_name(response),
+            "mime": sniff_mime(head[:URL_SNIFF_BYTES], response.headers.get("Content-Type")),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "revalidated": False,
+        }
+        if not version(record) and response.status_code != 206:
+            record["sha256"] = body_sha256(head, chunks)
+    if not version(record):
+        # Nothing says whether the file changed since the last visit, so its content is hashed every time.
+        with http_client().stream("GET", url) as response:
+            response.raise_for_status()
+            record["sha256"] = body_sha256(b"", response.iter_bytes())
+    return record
+
+def unresolved(url: str, error: Exception) -> dict:
+    # Unreachable from here: the OCR service gets the URL as is, typed by its extension, and reports its own error.
+    # The version is unknown, so the digest is never reused and the result never comes from the OCR cache.
+    return {"url": url, "final_url": url, "name": url_name(url),
+            "mime": mimetypes.guess_type(urlsplit(url).path)[0] or "application/octet-stream",
+            "etag": None, "last_modified": None, "revalidated": False, "error": str(error),
+            "digest": content_hash(url, uuid.uuid4().hex)}
+
+def resolve_url(url: str) -> dict:
+    # Returns the redirect target, sniffed MIME type and validators; "digest" identifies this version of the file.
+    url = url.strip()
+    with span("resolve_url") as current:
+        cached = url_cache.get(url)
+        try:
+            record = _fetch(url, cached)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            current.set_attribute("error", type(e).__name__)
+            return unresolved(url, e)
+        record["digest"] = content_hash(record["final_url"], version(record))
+        current.set_attribute("mime", record["mime"])
+        current.set_attribute("revalidated", record["revalidated"])
+        url_cache.set(url, {k: v for k, v in record.items() if k != "revalidated"})
+        return record
+
+def resolve_urls(urls: list[str], max_workers: int = URL_FETCH_WORKERS) -> list[dict]:
+    # Concurrent lookups over the shared pool, returned in input order.
+    records = run_ordered(urls, resolve_url, max_workers)
+    return [r if isinstance(r, dict) else unresolved(u.strip(), r) for u, r in zip(urls, records)]
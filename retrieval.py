@@ -0,0 +1,84 @@
+import re
+import time
+from functools import lru_cache
+import numpy as np
+from config import RETRIEVAL_CHUNK_CHARS, RETRIEVAL_TOP_K
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def chunk_text(text: str, chunk_size: int = RETRIEVAL_CHUNK_CHARS) -> list[str]:
+    chunks, current, size = [], [], 0
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        # Oversized paragraphs are cut into fixed slices so no chunk grows unbounded.
+        pieces = [para[i:i + chunk_size] for i in range(0, len(para), chunk_size)]
+        for piece in pieces:
+            if current and size + len(piece) > chunk_size:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+class RetrievalIndex:
+    def __init__(self, text: str, chunk_size: int = RETRIEVAL_CHUNK_CHARS, k1: float = 1.5, b: float = 0.75):
+        start = time.perf_counter()
+        self.chunk_size = chunk_size
+        self.k1 = k1
+        self.b = b
+        self.chunks = chunk_text(text, chunk_size)
+
+        postings = {}
+        lengths = np.zeros(len(self.chunks), dtype=np.float32)
+        for i, chunk in enumerate(self.chunks):
+            tokens = tokenize(chunk)
+            lengths[i] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(i)
+                postings[token][1].append(tf)
+
+        n = max(len(self.chunks), 1)
+        avg_length = max(float(lengths.mean()), 1.0) if len(lengths) else 1.0
+        self.norm = k1 * (1 - b + b * lengths / avg_length)
+        self.postings = {}
+        for token, (ids, tfs) in postings.items():
+            df = len(ids)
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            self.postings[token] = (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32), idf)
+        self.build_time = time.perf_counter() - start
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            ids, tfs, idf = self.postings[token]
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self.norm[ids])
+        return scores
+
+    def top_k(self, query: str, k: int = RETRIEVAL_TOP_K) -> list[int]:
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        return sorted(int(i) for i in best if scores[i] > 0) or list(range(k))
+
+    def context(self, query: str, k: int = RETRIEVAL_TOP_K) -> str:
+        # Passages are returned in document order so the model reads them in context.
+        return "\n\n---\n\n".join(self.chunks[i] for i in self.top_k(query, k))
+
+@lru_cache(maxsize=32)
+def get_index(text: str, chunk_size: int = RETRIEVAL_CHUNK_CHARS) -> RetrievalIndex:
+    return RetrievalIndex(text, chunk_size)
@@ -0,0 +1,204 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import httpx
+from opentelemetry import trace
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from config import (
+    RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, MAX_CONCURRENT_REQUESTS, MAX_ATTEMPTS, RETRY_BACKOFF_MAX
+)
+from telemetry import api_retries, api_throttled, queue_wait
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+def status_of(error: Exception) -> int | None:
+    return getattr(error, "status_code", None)
+
+def is_retryable(error: Exception) -> bool:
+    return status_of(error) in RETRYABLE_STATUS or isinstance(error, httpx.TransportError)
+
+def retry_after(error: Exception) -> float | None:
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class AdaptiveLimiter:
+    # Additive increase after a run of successes, multiplicative decrease on every throttle.
+    def __init__(self, max_limit: int, increase_after: int = 10):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.increase_after = increase_after
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def succeeded(self) -> None:
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+
+    def throttled(self) -> None:
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+class Scheduler:
+    def __init__(self, rate: float = RATE_LIMIT_PER_SECOND, burst: int = RATE_LIMIT_BURST,
+                 max_concurrency: int = MAX_CONCURRENT_REQUESTS, max_attempts: int = MAX_ATTEMPTS,
+                 backoff_max: float = RETRY_BACKOFF_MAX):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self._limits = (rate, burst, max_concurrency)
+        self.max_attempts = max_attempts
+        self.backoff_max = backoff_max
+        self._backoff = wait_random_exponential(multiplier=0.5, max=backoff_max)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.queue_wait = 0.0
+
+    def share(self, parts: int) -> None:
+        # Each process calling the API with one key (its workers and the app) takes an equal slice, so together
+        # they stay within the configured limits.
+        # Slices are taken from the full limits, so this is called again whenever the number of workers changes.
+        rate, burst, max_concurrency = self._limits
+        parts = max(1, parts)
+        with self._lock:
+            self.bucket.rate = rate / parts
+            self.bucket.capacity = max(1, burst // parts)
+            self.bucket.tokens = min(self.bucket.tokens, self.bucket.capacity)
+            self.limiter.max_limit = max(1, max_concurrency // parts)
+            self.limiter.limit = min(self.limiter.limit, self.limiter.max_limit)
+
+    def _wait(self, retry_state) -> float:
+        delay = retry_after(retry_state.outcome.exception())
+        if delay is None:
+            return self._backoff(retry_state)
+        # A server asking for an hour would otherwise park the calling thread for an hour.
+        delay = min(delay, self.backoff_max)
+        return delay + random.uniform(0, 0.1 * delay + 0.05)
+
+    def _attempt(self, fn, args, kwargs, hold: bool = False):
+        # With hold, the concurrency slot stays taken after a successful call; the caller releases it.
+        queued = time.perf_counter()
+        self.bucket.acquire()
+        self.limiter.acquire()
+        try:
+            waited = time.perf_counter() - queued
+            with self._lock:
+                self.calls += 1
+                self.queue_wait += waited
+            queue_wait.record(waited)
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.limiter.release()
+            if status_of(e) == 429:
+                with self._lock:
+                    self.throttled += 1
+                api_throttled.add(1)
+                self.limiter.throttled()
+            raise
+        if not hold:
+            self.limiter.release()
+        self.limiter.succeeded()
+        return result
+
+    def _retrying(self) -> Retrying:
+        return Retrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=self._wait,
+            retry=retry_if_exception(is_retryable),
+            before_sleep=self._count_retry,
+            reraise=True,
+        )
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in self._retrying():
+            with attempt:
+                return self._attempt(fn, args, kwargs)
+
+    def stream(self, fn, *args, **kwargs):
+        # Like call, but the concurrency slot is held until the stream is consumed or closed, so long
+        # generations count toward the in-flight limit. Only opening the stream is retried.
+        for attempt in self._retrying():
+            with attempt:
+                events = self._attempt(fn, args, kwargs, hold=True)
+        try:
+            yield from events
+        finally:
+            self.limiter.release()
+
+    def _count_retry(self, retry_state) -> None:
+        with self._lock:
+            self.retries += 1
+        error = retry_state.outcome.exception()
+        api_retries.add(1, {"status": str(status_of(error) or type(error).__name__)})
+        trace.get_current_span().add_event("retry", {
+            "attempt": retry_state.attempt_number,
+            "error": type(error).__name__,
+            "status": status_of(error) or 0,
+        })
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "concurrency_limit": self.limiter.limit,
+                "queue_wait": self.queue_wait,
+            }
+
+scheduler = Scheduler()
@@ -0,0 +1,99 @@
+import html
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+import numpy as np
+from config import SEARCH_SNIPPET_CONTEXT
+from ocr_service import split_pages
+
+MARK = "<mark style='background-color: #ffeb3b;'>{}</mark>"
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchHit:
+    __slots__ = ("doc", "page", "unit", "start", "end")
+
+    def __init__(self, doc: int, page: int, unit: int, start: int, end: int):
+        self.doc = doc
+        self.page = page
+        self.unit = unit
+        self.start = start
+        self.end = end
+
+class SearchIndex:
+    # Trigram postings narrow a literal query to candidate pages; matches are then confirmed with re.
+    def __init__(self, documents: list[dict]):
+        start = time.perf_counter()
+        self.names = [d["name"] for d in documents]
+        self.units = []
+        postings = defaultdict(list)
+        for d, doc in enumerate(documents):
+            for number, page in enumerate(split_pages(doc["text"], doc.get("page_offsets")), start=1):
+                unit = len(self.units)
+                self.units.append((d, number, page))
+                for gram in trigrams(page.lower()):
+                    postings[gram].append(unit)
+        self.postings = {gram: np.asarray(units, dtype=np.int32) for gram, units in postings.items()}
+        self.build_time = time.perf_counter() - start
+
+    def _candidates(self, query: str, regex: bool) -> np.ndarray:
+        grams = trigrams(query.lower()) if not regex else set()
+        if not grams:
+            return np.arange(len(self.units), dtype=np.int32)
+        lists = sorted((self.postings.get(g) for g in grams), key=lambda a: -1 if a is None else len(a))
+        if lists[0] is None:
+            return np.empty(0, dtype=np.int32)
+        candidates = lists[0]
+        for units in lists[1:]:
+            candidates = np.intersect1d(candidates, units, assume_unique=True)
+            if not len(candidates):
+                break
+        return candidates
+
+    def search(self, query: str, regex: bool = False, doc: int | None = None) -> list[SearchHit]:
+        if not query:
+            return []
+        pattern = re.compile(query if regex else re.escape(query), re.IGNORECASE)
+        hits = []
+        for unit in self._candidates(query, regex):
+            d, number, page = self.units[unit]
+            if doc is not None and d != doc:
+                continue
+            hits.extend(SearchHit(d, number, int(unit), m.start(), m.end())
+                        for m in pattern.finditer(page) if m.end() > m.start())
+        return hits
+
+    def counts(self, hits: list[SearchHit]) -> dict[int, dict]:
+        counts = {}
+        for hit in hits:
+            entry = counts.setdefault(hit.doc, {"total": 0, "pages": {}})
+            entry["total"] += 1
+            entry["pages"][hit.page] = entry["pages"].get(hit.page, 0) + 1
+        return counts
+
+    def snippet(self, hit: SearchHit, context: int = SEARCH_SNIPPET_CONTEXT) -> str:
+        page = self.units[hit.unit][2]
+        left = max(0, hit.start - context)
+        right = min(len(page), hit.end + context)
+        return "".join((
+            "…" if left else "",
+            html.escape(page[left:hit.start]),
+            MARK.format(html.escape(page[hit.start:hit.end])),
+            html.escape(page[hit.end:right]),
+            "…" if right < len(page) else "",
+        ))
+
+def load_jsonl(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    # python search_index.py results.jsonl "query" [--regex]
+    index = SearchIndex(load_jsonl(sys.argv[1]))
+    hits = index.search(sys.argv[2], regex="--regex" in sys.argv)
+    for d, entry in index.counts(hits).items():
+        pages = ", ".join(f"p{p}: {n}" for p, n in sorted(entry["pages"].items()))
+        print(f"{index.names[d]}: {entry['total']} match(es) ({pages})")
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from opentelemetry import metrics as otel_metrics, trace
+from opentelemetry.trace import Status, StatusCode
+from config import TELEMETRY_SERVICE_NAME, TELEMETRY_DIR, TELEMETRY_EXPORT_INTERVAL_MS
+from metrics import metrics
+
+# Instruments come from the API's proxy providers, so they are no-ops until configure() installs the SDK.
+# Library code (including language-detection worker processes) never configures anything itself.
+tracer = trace.get_tracer("mistral_ocr")
+meter = otel_metrics.get_meter("mistral_ocr")
+
+duration = meter.create_histogram("operation.duration", unit="s", description="Wall time per traced operation")
+upload_bytes = meter.create_counter("ocr.upload.bytes", unit="By", description="Document bytes sent for OCR")
+ocr_page_count = meter.create_counter("ocr.pages", unit="{page}", description="Pages returned by the OCR API")
+ocr_deduplicated = meter.create_counter("ocr.deduplicated", unit="{document}", description="Documents that reused another document's OCR")
+llm_tokens = meter.create_counter("llm.tokens", unit="{token}", description="Prompt and completion tokens")
+cache_requests = meter.create_counter("cache.requests", unit="{request}", description="Cache lookups by result")
+api_retries = meter.create_counter("api.retries", unit="{retry}", description="Retried API calls")
+api_throttled = meter.create_counter("api.throttled", unit="{response}", description="429 responses")
+queue_wait = meter.create_histogram("api.queue_wait", unit="s", description="Time spent waiting for a rate-limit token and a concurrency slot")
+
+_configured = False
+_configure_lock = threading.Lock()
+
+def collector_configured() -> bool:
+    return any(os.environ.get(name) for name in (
+        "OTEL_EXPORTER_OTLP_ENDPOINT", "OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "OTEL_EXPORTER_OTLP_METRICS_ENDPOINT"
+    ))
+
+def configure() -> str:
+    # Exports over OTLP/HTTP when a collector is configured, otherwise appends JSON lines under TELEMETRY_DIR.
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return _destination()
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        if collector_configured():
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            span_exporter, metric_exporter = OTLPSpanExporter(), OTLPMetricExporter()
+        else:
+            os.makedirs(TELEMETRY_DIR, exist_ok=True)
+            span_exporter = ConsoleSpanExporter(
+                out=open(os.path.join(TELEMETRY_DIR, "spans.jsonl"), "a"),
+                formatter=lambda span: span.to_json(indent=None) + "\n"
+            )
+            metric_exporter = ConsoleMetricExporter(
+                out=open(os.path.join(TELEMETRY_DIR, "metrics.jsonl"), "a"),
+                formatter=lambda data: data.to_json(indent=None) + "\n"
+            )
+
+        resource = Resource.create({"service.name": TELEMETRY_SERVICE_NAME})
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        trace.set_tracer_provider(tracer_provider)
+        reader = PeriodicExportingMetricReader(metric_exporter, export_interval_millis=TELEMETRY_EXPORT_INTERVAL_MS)
+        otel_metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=[reader]))
+        _configured = True
+        return _destination()
+
+def _destination() -> str:
+    return "OTLP collector" if collector_configured() else TELEMETRY_DIR
+
+def _finish(name: str, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    duration.record(elapsed, {"operation": name})
+    metrics.record(f"span.{name}", elapsed)
+
+@contextmanager
+def span(name: str, **attributes):
+    start = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(name, attributes=attributes) as current:
+            yield current
+    finally:
+        _finish(name, start)
+
+def traced_stream(name: str, items, **attributes):
+    # Generators are resumed from arbitrary threads and reruns, so the span is never made current.
+    current = tracer.start_span(name, attributes=attributes)
+    start = time.perf_counter()
+    count = 0
+    try:
+        for item in items:
+            count += 1
+            yield item
+    except Exception as e:
+        current.record_exception(e)
+        current.set_status(Status(StatusCode.ERROR, str(e)))
+        raise
+    finally:
+        current.set_attribute("items", count)
+        current.end()
+        _finish(name, start)
+
+def record_usage(usage, operation: str) -> None:
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None) or 0
+        llm_tokens.add(tokens, {"type": kind, "operation": operation})
+        trace.get_current_span().set_attribute(f"llm.{kind}_tokens", tokens)
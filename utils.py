@@ -1,16 +1,21 @@
 import base64
 import json
+import re
 from docx import Document
 from langdetect import detect
+from telemetry import span, upload_bytes
 
 def encode_file(file_bytes, mime):
-    return f"data:{mime};base64,{base64.b64encode(file_bytes).decode()}"
+    with span("encode_file", bytes=len(file_bytes), mime=mime):
+        upload_bytes.add(len(file_bytes), {"mode": "inline"})
+        return f"data:{mime};base64,{base64.b64encode(file_bytes).decode()}"
 
 def detect_language(text: str) -> str:
-    try:
-        return detect(text)
-    except:
-        return "unknown"
+    with span("detect_language", chars=len(text)):
+        try:
+            return detect(text)
+        except:
+            return "unknown"
 
 def download_link(content, filename, mime):
     b64 = base64.b64encode(content.encode()).decode()
@@ -45,3 +50,13 @@ LANGUAGE_MAP = {
     "pa": "Punjabi",
     "ur": "Urdu"
 }
+
+def pdf_page_count(file_bytes: bytes) -> int | None:
+    # Reads /Count from the page-tree dictionaries; None when they sit in compressed object streams.
+    counts = [
+        int(m.group(1))
+        for tree in re.finditer(rb"<<(?:(?!>>).){0,400}?/Type\s*/Pages\b(?:(?!>>).){0,400}?>>", file_bytes, re.S)
+        for m in [re.search(rb"/Count\s+(\d+)", tree.group(0))]
+        if m
+    ]
+    return max(counts) if counts else None